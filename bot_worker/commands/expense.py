@@ -1,14 +1,33 @@
-from utils import parse_record_message
+from utils import parse_record_lines
+from commands.recording import write_records
 
 async def handle_expense(ctx, text):
-    """Handles the /expense command."""
-    print("Handling /expense command")
-    record = parse_record_message(text, is_expense=True)
+    """
+    Handles the /expense command.
+    Accepts one item per line, including a pasted Keep checklist,
+    and writes all rows with a single Sheets append.
+    """
+    records, invalid_lines = parse_record_lines(text, is_expense=True)
     
-    if not record:
-        error = "Invalid format. Use: /expense <amount> <description> [category]"
+    if not records:
+        error = (
+            "Invalid format. Use: /expense <amount> <description> [category]\n"
+            "or one item per line, e.g. a pasted Keep checklist (☐ description amount)."
+        )
         await ctx.reply(error)
+        return
+
+    written = await write_records(ctx, records)
+
+    status = "✅ Recorded" if written else "⏳ Queued"
+    if len(records) == 1:
+        record = records[0]
+        reply = f"{status} expense: ฿{record['amount']} for {record['description']}"
     else:
-        row = [record['date'], record['category'], record['description'], record['amount'], record['uncleared']]
-        await ctx.sheets_client.append_row(row)
-        await ctx.reply(f"✅ Recorded expense: ฿{record['amount']} for {record['description']}")
+        total = sum(r['amount'] for r in records)
+        reply = f"{status} {len(records)} expenses, total ฿{total:,.2f}"
+    if not written:
+        reply += "\nThe bot is busy; it will be written to the sheet shortly."
+    if invalid_lines:
+        reply += f"\n⚠️ Skipped {len(invalid_lines)} unrecognized line(s)."
+    await ctx.reply(reply)
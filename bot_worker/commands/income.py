@@ -1,14 +1,29 @@
-from utils import parse_record_message
+from utils import parse_record_lines
+from commands.recording import write_records
 
 async def handle_income(ctx, text):
-    """Handles the /income command."""
-    print("Handling /income command")
-    record = parse_record_message(text, is_expense=False)
+    """
+    Handles the /income command.
+    Accepts one item per line and writes all rows with a single Sheets append.
+    """
+    records, invalid_lines = parse_record_lines(text, is_expense=False)
     
-    if not record:
+    if not records:
         error = "Invalid format. Use: /income <amount> <description>"
         await ctx.reply(error)
+        return
+
+    written = await write_records(ctx, records)
+
+    status = "✅ Recorded" if written else "⏳ Queued"
+    if len(records) == 1:
+        record = records[0]
+        reply = f"{status} income: ฿{record['amount']} for {record['description']}"
     else:
-        row = [record['date'], record['category'], record['description'], record['amount'], record['uncleared']]
-        await ctx.sheets_client.append_row(row)
-        await ctx.reply(f"✅ Recorded income: ฿{record['amount']} for {record['description']}")
+        total = sum(r['amount'] for r in records)
+        reply = f"{status} {len(records)} incomes, total ฿{total:,.2f}"
+    if not written:
+        reply += "\nThe bot is busy; it will be written to the sheet shortly."
+    if invalid_lines:
+        reply += f"\n⚠️ Skipped {len(invalid_lines)} unrecognized line(s)."
+    await ctx.reply(reply)
@@ -0,0 +1,54 @@
+import re
+from utils import build_monthly_totals
+from domain.monthly_totals import MonthlyTotals
+from tracing import log
+
+async def handle_reconcile(ctx, text="/reconcile"):
+    """
+    Handles the /reconcile command.
+    Rebuilds the materialized monthly totals in KV from the sheet,
+    e.g. after a fetcher upload has rewritten the ledger.
+    With a period (/reconcile 01-2026) only that month is read and rebuilt.
+    """
+    if not ctx.totals_repo:
+        await ctx.reply("Monthly totals storage is not configured.")
+        return
+
+    target_month = None
+    parts = text.split()
+    if len(parts) > 1:
+        match = re.match(r"(\d{1,2})-(\d{4})$", parts[1])
+        if not match or not 1 <= int(match.group(1)) <= 12:
+            await ctx.reply("Invalid format. Use: /reconcile [mm-yyyy]")
+            return
+        target_month = f"{match.group(2)}-{int(match.group(1)):02d}"
+
+    if not await ctx.allow_sheets_call():
+        await ctx.reply("🐢 Too many requests right now. Please try again in a minute.")
+        return
+
+    try:
+        # Read the version first: an upload racing with the read then only
+        # makes the totals look stale, never the other way round
+        version = await ctx.sheets_client.get_data_version()
+        if target_month:
+            records = await ctx.sheets_client.get_month_records(target_month)
+            months = build_monthly_totals(records)
+            months = {target_month: months.get(target_month, {'expenses': {}, 'income': 0.0, 'count': 0})}
+        else:
+            records = await ctx.sheets_client.get_all_records()
+            months = build_monthly_totals(records)
+
+        for month, data in months.items():
+            await ctx.totals_repo.save(MonthlyTotals(
+                month=month,
+                expenses=data['expenses'],
+                income=data['income'],
+                count=data['count'],
+                version=version
+            ))
+        await ctx.totals_repo.save_version(version)
+        await ctx.reply(f"✅ Rebuilt totals for {len(months)} month(s) from {len(records)} record(s).")
+    except Exception as e:
+        log("Error in handle_reconcile", level="error", error=str(e))
+        await ctx.reply("Sorry, failed to rebuild monthly totals.")
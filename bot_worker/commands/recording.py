@@ -0,0 +1,41 @@
+from utils import record_to_row
+from tracing import log
+
+async def write_records(ctx, records):
+    """
+    Append records to the sheet and update the monthly totals.
+
+    When the rate limiter refuses the Sheets call, or the append still fails
+    after its retries, the records are queued in KV instead and written
+    together with the next allowed append.
+
+    Returns:
+        bool: True if written now, False if deferred.
+    """
+    if not await ctx.allow_sheets_call() and ctx.pending_appends:
+        await ctx.pending_appends.push(records)
+        return False
+
+    pending = await ctx.pending_appends.drain() if ctx.pending_appends else []
+    to_write = pending + records
+    if not to_write:
+        return True
+    if pending:
+        log("Flushing deferred records", count=len(pending))
+
+    try:
+        await ctx.sheets_client.append_rows([record_to_row(r) for r in to_write])
+    except Exception as e:
+        if not ctx.pending_appends:
+            raise
+        # Queue everything (including the drained records) so nothing is lost
+        log("Append failed, queueing records", level="warning", error=str(e))
+        await ctx.pending_appends.push(to_write)
+        return False
+
+    if ctx.totals_repo:
+        try:
+            await ctx.totals_repo.apply_records(to_write)
+        except Exception as e:
+            log("Error updating monthly totals", level="warning", error=str(e))
+    return True
@@ -1,5 +1,15 @@
-from utils import get_pivot_report_data
+import asyncio
+import re
+from datetime import datetime
+from utils import parse_pivot_rows, month_span, aggregate_pivot_months, compare_pivot_months, MONTH_ABBRS
 from telegram_light import escape_markdown_v2
+from tracing import annotate, log
+
+PERIOD_PATTERN = re.compile(r"(\d{1,2})-(\d{4})$")
+YEAR_PATTERN = re.compile(r"(\d{4})$")
+RANGE_PATTERN = re.compile(r"(\d{1,2})-(\d{4})\.\.(\d{1,2})-(\d{4})$")
+COMPARE_ARGS = ("mom", "compare")
+PIVOT_RANGE = "'(Pivot) Annual Report'!A:K"
 
 CATEGORY_EMOJIS = {
     'Shopping': '🛍️',
@@ -13,32 +23,197 @@ CATEGORY_EMOJIS = {
     'Income': '💰'
 }
 
-async def handle_report(ctx, text="/report"):
-    """Handles the /report command using the Pivot Annual Report."""
-    print(f"Handling /report command with text: {text}")
+def build_report_message(data):
+    """
+    Build the MarkdownV2 report with partial masking.
+    For a full block quote, every line must start with '>'.
+    """
+    title = f"📅 Report: {data['month']} {data['year']}"
+    report = f">*{escape_markdown_v2(title)}*\n>\n"
     
-    # Parse month-year if provided: /report 01-2026
-    target_month = None
-    target_year = None
-    period_label = "current month"
+    if data['summary']:
+        report += f">*{escape_markdown_v2('Expenses by Category:')}*\n"
+        # Sort by amount descending
+        for cat, amt in sorted(data['summary'].items(), key=lambda x: x[1], reverse=True):
+            emoji = CATEGORY_EMOJIS.get(cat, '📦')
+            masked_amt = f"||{escape_markdown_v2(f'฿{amt:,.2f}')}||"
+            report += f">{emoji} {escape_markdown_v2(cat)}: {masked_amt}\n"
     
-    parts = text.split()
-    if len(parts) > 1:
-        arg = parts[1]
-        import re
-        match = re.match(r"(\d{1,2})-(\d{4})", arg)
-        if match:
-            m_str, y_str = match.groups()
-            try:
-                m_int = int(m_str)
-                if 1 <= m_int <= 12:
-                    from datetime import datetime
-                    # Convert to 'Jan', 'Feb', etc.
-                    target_month = datetime(2000, m_int, 1).strftime("%b")
-                    target_year = y_str
-                    period_label = f"{target_month} {target_year}"
-            except ValueError:
-                pass
+    total_label = "Total Monthly Expense:"
+    total_val = data['total']
+    masked_total = f"||{escape_markdown_v2(f'฿{total_val:,.2f}')}||"
+    
+    report += f">\n>💰 *{escape_markdown_v2(total_label)}* {masked_total}"
+    return report
+
+def _mask_amount(amount):
+    return f"||{escape_markdown_v2(f'฿{amount:,.2f}')}||"
+
+def build_range_report_message(label, data):
+    """Build the MarkdownV2 report for several months (range or year-to-date)."""
+    report = f">*{escape_markdown_v2(f'📅 Report: {label}')}*\n>\n"
+
+    if data['summary']:
+        report += f">*{escape_markdown_v2('Expenses by Category:')}*\n"
+        for cat, amt in sorted(data['summary'].items(), key=lambda x: x[1], reverse=True):
+            emoji = CATEGORY_EMOJIS.get(cat, '📦')
+            report += f">{emoji} {escape_markdown_v2(cat)}: {_mask_amount(amt)}\n"
+
+    report += f">\n>*{escape_markdown_v2('Monthly Totals:')}*\n"
+    for month, year, total in data['monthly']:
+        report += f">{escape_markdown_v2(f'{month} {year}')}: {_mask_amount(total)}\n"
+
+    average = data['total'] / len(data['monthly'])
+    report += f">\n>📈 *{escape_markdown_v2('Monthly Average:')}* {_mask_amount(average)}"
+    report += f"\n>💰 *{escape_markdown_v2('Total Expense:')}* {_mask_amount(data['total'])}"
+    return report
+
+def build_comparison_message(current_label, previous_label, data):
+    """Build the MarkdownV2 month-over-month comparison."""
+    report = f">*{escape_markdown_v2(f'📊 {current_label} vs {previous_label}')}*\n>\n"
+
+    def delta(current, previous):
+        diff = current - previous
+        arrow = '▲' if diff > 0 else '▼' if diff < 0 else '='
+        return f"{escape_markdown_v2(arrow)} {_mask_amount(abs(diff))}"
+
+    for cat, current, previous in data['rows']:
+        emoji = CATEGORY_EMOJIS.get(cat, '📦')
+        report += f">{emoji} {escape_markdown_v2(cat)}: {_mask_amount(current)} \\({delta(current, previous)}\\)\n"
+
+    current_total, previous_total = data['total']
+    report += (
+        f">\n>💰 *{escape_markdown_v2('Total:')}* {_mask_amount(current_total)} "
+        f"\\({delta(current_total, previous_total)}\\)"
+    )
+    return report
+
+def parse_report_period(args, now=None):
+    """
+    Parse the /report arguments into a period spec.
+
+    Supported forms:
+    - (none)                  current month
+    - MM-YYYY                 one month
+    - YYYY                    whole year (year-to-date for the current year)
+    - MM-YYYY..MM-YYYY        month range
+    - mom|compare [MM-YYYY]   month-over-month comparison
+
+    Returns: {'kind': 'month'|'range'|'compare', 'keys': [(year, 'Mon'), ...], 'label': str}
+    Unrecognized arguments fall back to the current month.
+    """
+    now = now or datetime.now()
+    current = (now.year, now.month)
+    arg = args[0] if args else ""
+
+    def month_arg(value):
+        match = PERIOD_PATTERN.match(value)
+        if match and 1 <= int(match.group(1)) <= 12:
+            return int(match.group(2)), int(match.group(1))
+        return None
+
+    if arg.lower() in COMPARE_ARGS:
+        year, month = (month_arg(args[1]) if len(args) > 1 else None) or current
+        prev_year, prev_month = (year, month - 1) if month > 1 else (year - 1, 12)
+        keys = [(str(year), MONTH_ABBRS[month - 1]), (str(prev_year), MONTH_ABBRS[prev_month - 1])]
+        return {'kind': 'compare', 'keys': keys, 'label': f"{keys[0][1]} {keys[0][0]} vs {keys[1][1]} {keys[1][0]}"}
+
+    match = RANGE_PATTERN.match(arg)
+    if match:
+        m1, y1, m2, y2 = (int(g) for g in match.groups())
+        if 1 <= m1 <= 12 and 1 <= m2 <= 12 and (y1, m1) <= (y2, m2):
+            keys = month_span(y1, m1, y2, m2)
+            return {'kind': 'range', 'keys': keys, 'label': f"{keys[0][1]} {keys[0][0]} – {keys[-1][1]} {keys[-1][0]}"}
+
+    match = YEAR_PATTERN.match(arg)
+    if match:
+        year = int(match.group(1))
+        last_month = now.month if year == now.year else 12
+        label = f"{year} (YTD)" if year == now.year else str(year)
+        return {'kind': 'range', 'keys': month_span(year, 1, year, last_month), 'label': label}
+
+    requested = month_arg(arg)
+    year, month = requested or current
+    key = (str(year), MONTH_ABBRS[month - 1])
+    label = f"{key[1]} {key[0]}" if requested else "current month"
+    return {'kind': 'month', 'keys': [key], 'label': label, 'current': (year, month) == current}
+
+def recent_months(now=None):
+    """(year, month) of the current and previous month, newest first."""
+    now = now or datetime.now()
+    previous = (now.year, now.month - 1) if now.month > 1 else (now.year - 1, 12)
+    return [(now.year, now.month), previous]
+
+def report_cache_key(period):
+    """KV report cache key of a parsed period, e.g. 'month:2026-Feb'."""
+    return f"{period['kind']}:" + ",".join(f"{y}-{m}" for y, m in period['keys'])
+
+def build_period_message(period, months):
+    """Render the report for a parsed period from parsed pivot months, or None if empty."""
+    if period['kind'] == 'month':
+        year, month = period['keys'][0]
+        data = months.get((year, month))
+        if not data:
+            return None
+        return build_report_message({'month': month, 'year': year, 'summary': data['summary'], 'total': data['total']})
+
+    if period['kind'] == 'range':
+        data = aggregate_pivot_months(months, period['keys'])
+        return build_range_report_message(period['label'], data) if data else None
+
+    (cur_year, cur_month), (prev_year, prev_month) = period['keys']
+    data = compare_pivot_months(months, period['keys'][0], period['keys'][1])
+    if not data:
+        return None
+    return build_comparison_message(f"{cur_month} {cur_year}", f"{prev_month} {prev_year}", data)
+
+async def handle_report(ctx, text="/report"):
+    """
+    Handles the /report command using the Pivot Annual Report.
+    Single months, ranges, years and comparisons are all answered from one
+    read of the pivot sheet, parsed in a single pass.
+    """
+    period = parse_report_period(text.split()[1:])
+    period_label = period['label']
+    annotate(report_kind=period['kind'])
+
+    # Current or previous month: answer from the materialized totals in KV.
+    # The scheduled warm-up keeps both months materialized. Totals stamped
+    # with an older data version than the latest rebuild saw are stale (a
+    # fetcher upload rewrote the ledger in between), so the pivot answers.
+    year, month = period['keys'][0]
+    month_num = MONTH_ABBRS.index(month) + 1
+    if period['kind'] == 'month' and ctx.totals_repo and (int(year), month_num) in recent_months():
+        try:
+            totals, version = await asyncio.gather(
+                ctx.totals_repo.get(f"{year}-{month_num:02d}"), ctx.totals_repo.get_version()
+            )
+            if totals is not None and totals.version != version:
+                annotate(totals_stale=True)
+                totals = None
+            if totals is not None:
+                data = {
+                    'month': month,
+                    'year': year,
+                    'summary': {cat: amt for cat, amt in totals.expenses.items() if amt > 0},
+                    'total': totals.total_expense
+                }
+                annotate(report_source="kv_totals")
+                await ctx.reply(build_report_message(data), parse_mode='MarkdownV2', protect_content=True)
+                return
+        except Exception as e:
+            log("Error reading monthly totals, falling back to sheet", level="warning", error=str(e))
+
+    # Over the rate limit: answer from the report cache or ask to slow down
+    cache_key = report_cache_key(period)
+    if not await ctx.allow_sheets_call():
+        cached = await ctx.report_cache.get(cache_key) if ctx.report_cache else None
+        annotate(report_source="cache" if cached else "rate_limited")
+        if cached:
+            await ctx.reply(cached, parse_mode='MarkdownV2', protect_content=True)
+        else:
+            await ctx.reply("🐢 Too many requests right now. Please try again in a minute.")
+        return
 
     # Send loading message and store the response to get message_id
     loading_msg = await ctx.reply(f"Fetching report for {period_label}... please wait.")
@@ -46,35 +221,22 @@ async def handle_report(ctx, text="/report"):
     
     try:
         # Fetch data from the specific Pivot sheet
-        range_name = "'(Pivot) Annual Report'!A:K"
-        values = await ctx.sheets_client.get_values(range_name)
+        values = await ctx.sheets_client.get_values(PIVOT_RANGE)
+        annotate(report_source="pivot")
         
-        data = get_pivot_report_data(values, target_month=target_month, target_year=target_year)
-        if not data:
+        report = build_period_message(period, parse_pivot_rows(values))
+        if not report:
             error_msg = f"No records found for {period_label}."
             if loading_id:
                 await ctx.delete_message(loading_id)
             await ctx.reply(error_msg)
             return
 
-        # Build simplified MarkdownV2 report with partial masking
-        # For a full block quote, every line must start with '>'
-        title = f"📅 Report: {data['month']} {data['year']}"
-        report = f">*{escape_markdown_v2(title)}*\n>\n"
-        
-        if data['summary']:
-            report += f">*{escape_markdown_v2('Expenses by Category:')}*\n"
-            # Sort by amount descending
-            for cat, amt in sorted(data['summary'].items(), key=lambda x: x[1], reverse=True):
-                emoji = CATEGORY_EMOJIS.get(cat, '📦')
-                masked_amt = f"||{escape_markdown_v2(f'฿{amt:,.2f}')}||"
-                report += f">{emoji} {escape_markdown_v2(cat)}: {masked_amt}\n"
-        
-        total_label = "Total Monthly Expense:"
-        total_val = data['total']
-        masked_total = f"||{escape_markdown_v2(f'฿{total_val:,.2f}')}||"
-        
-        report += f">\n>💰 *{escape_markdown_v2(total_label)}* {masked_total}"
+        if ctx.report_cache:
+            try:
+                await ctx.report_cache.put(cache_key, report)
+            except Exception as e:
+                log("Error caching report", level="warning", error=str(e))
         
         # Delete the "Fetching..." message if we have its ID
         if loading_id:
@@ -84,7 +246,7 @@ async def handle_report(ctx, text="/report"):
         await ctx.reply(report, parse_mode='MarkdownV2', protect_content=True)
         
     except Exception as e:
-        print(f"Error in handle_report: {e}")
+        log("Error in handle_report", level="error", error=str(e))
         error_msg = "Sorry, failed to fetch the report."
         if loading_id:
             await ctx.delete_message(loading_id)
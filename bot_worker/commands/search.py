@@ -0,0 +1,69 @@
+from datetime import datetime
+from utils import MONTH_ABBRS
+from telegram_light import escape_markdown_v2
+from commands.report import PERIOD_PATTERN, YEAR_PATTERN, RANGE_PATTERN, parse_report_period
+from tracing import log
+
+USAGE = "Usage: /search <term> [mm-yyyy | yyyy | mm-yyyy..mm-yyyy]"
+
+def parse_search_args(args, now=None):
+    """
+    Split /search arguments into the search term and a period spec.
+    A trailing period argument is optional; without it the current year
+    (to date) is searched.
+    """
+    now = now or datetime.now()
+    if args and any(p.match(args[-1]) for p in (RANGE_PATTERN, PERIOD_PATTERN, YEAR_PATTERN)):
+        term, period_args = args[:-1], args[-1:]
+    else:
+        term, period_args = args, [str(now.year)]
+    return " ".join(term), parse_report_period(period_args, now=now)
+
+def build_search_message(term, label, matches):
+    """
+    Format per-month search sums as a MarkdownV2 reply. All text is escaped,
+    since the term is the user's own input.
+    """
+    if not matches:
+        return escape_markdown_v2(f"🔎 No expenses matching \"{term}\" in {label}.")
+
+    total = sum(entry[0] for entry in matches.values())
+    count = sum(entry[1] for entry in matches.values())
+    lines = [
+        f"🔎 \"{term}\" in {label}",
+        f"Total: ฿{total:,.2f} across {count} item(s)",
+        ""
+    ]
+    for month in sorted(matches):
+        amount, n = matches[month]
+        year, month_num = month.split("-")
+        lines.append(f"{MONTH_ABBRS[int(month_num) - 1]} {year}: ฿{amount:,.2f} ({n})")
+    return escape_markdown_v2("\n".join(lines))
+
+async def handle_search(ctx, text):
+    """
+    Handles the /search command.
+    Sums the expenses whose description (or category) matches every word of
+    the term, answered from the published search index in one Sheets read.
+    """
+    term, period = parse_search_args(text.split()[1:])
+    if not term:
+        await ctx.reply(USAGE)
+        return
+
+    if not await ctx.allow_sheets_call():
+        await ctx.reply("🐢 Too many requests right now. Please try again in a minute.")
+        return
+
+    try:
+        index = await ctx.sheets_client.get_search_index()
+        if index is None:
+            await ctx.reply("The search index has not been built yet. It is published by the next fetcher upload.")
+            return
+
+        months = {f"{year}-{MONTH_ABBRS.index(abbr) + 1:02d}" for year, abbr in period['keys']}
+        matches = index.search(term, months)
+        await ctx.reply(build_search_message(term, period['label'], matches), parse_mode='MarkdownV2')
+    except Exception as e:
+        log("Error in handle_search", level="error", error=str(e))
+        await ctx.reply("Sorry, failed to search your expenses.")
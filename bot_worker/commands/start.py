@@ -1,12 +1,17 @@
-async def handle_start(ctx):
+async def handle_start(ctx, text=None):
     """Handles the /start command."""
-    print("Handling /start command")
     welcome = (
         "Hi! I'm your Expense Manager Bot (Lightweight Worker Edition).\n\n"
         "Commands:\n"
         "/expense <amount> <description> [category]\n"
         "/income <amount> <description>\n"
+        "(send several items on separate lines, or paste a Keep checklist)\n"
         "/report - Get current month summary\n"
-        "/report [mm-yyyy] - Get specific month summary"
+        "/report [mm-yyyy] - Get specific month summary\n"
+        "/report yyyy - Year (to date) summary\n"
+        "/report mm-yyyy..mm-yyyy - Summary over a range of months\n"
+        "/report mom [mm-yyyy] - Compare a month with the previous one\n"
+        "/reconcile [mm-yyyy] - Rebuild cached monthly totals from the sheet\n"
+        "/search <term> [period] - Total spent on matching items (default: this year)"
     )
     await ctx.reply(welcome)
@@ -1,14 +1,22 @@
 from telegram_light import send_telegram_message, delete_telegram_message
+from tracing import log
 
 class BotContext:
     """
     Shared context for bot commands.
-    Encapsulates dependencies like the bot token, chat ID, and sheets client.
+    Encapsulates dependencies like the bot token, chat ID, sheets client,
+    the materialized monthly totals repository and the rate limiting pieces.
     """
-    def __init__(self, token, chat_id, sheets_client=None):
+    def __init__(self, token, chat_id, sheets_client=None, totals_repo=None,
+                 user_id=None, rate_limiter=None, pending_appends=None, report_cache=None):
         self.token = token
         self.chat_id = chat_id
         self.sheets_client = sheets_client
+        self.totals_repo = totals_repo
+        self.user_id = user_id
+        self.rate_limiter = rate_limiter
+        self.pending_appends = pending_appends
+        self.report_cache = report_cache
 
     async def reply(self, text, parse_mode='Markdown', protect_content=False):
         """Helper to send a message back to the current chat."""
@@ -17,3 +25,13 @@ class BotContext:
     async def delete_message(self, message_id):
         """Helper to delete a message in the current chat."""
         return await delete_telegram_message(self.token, self.chat_id, message_id)
+
+    async def allow_sheets_call(self):
+        """Check the rate limiter before spending shared Sheets quota."""
+        if not self.rate_limiter:
+            return True
+        try:
+            return await self.rate_limiter.allow(self.user_id)
+        except Exception as e:
+            log("Rate limiter error, allowing request", level="warning", error=str(e))
+            return True
@@ -0,0 +1,60 @@
+class MonthlyTotals:
+    """
+    Domain model holding running per-category totals for one month.
+    The month key uses the 'YYYY-MM' format. `version` is the sheet's data
+    version (published by the fetcher) the totals were rebuilt from.
+    """
+    def __init__(self, month: str, expenses: dict = None, income: float = 0.0, count: int = 0,
+                 version: str = None):
+        self.month = month
+        self.expenses = expenses or {}
+        self.income = income
+        self.count = count
+        self.version = version
+
+    @property
+    def total_expense(self) -> float:
+        return sum(self.expenses.values())
+
+    def add(self, category: str, amount: float):
+        """Apply one recorded expense or income to the running totals."""
+        if category == 'Income':
+            self.income += amount
+        else:
+            self.expenses[category] = self.expenses.get(category, 0.0) + amount
+        self.count += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "month": self.month,
+            "expenses": self.expenses,
+            "income": self.income,
+            "count": self.count,
+            "version": self.version
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(
+            month=data.get("month", ""),
+            expenses=data.get("expenses", {}),
+            income=data.get("income", 0.0),
+            count=data.get("count", 0),
+            version=data.get("version")
+        )
+
+class MonthlyTotalsRepository:
+    """
+    Repository interface for materialized monthly totals.
+    """
+    async def get(self, month: str) -> MonthlyTotals:
+        raise NotImplementedError
+
+    async def save(self, totals: MonthlyTotals):
+        raise NotImplementedError
+
+    async def get_version(self) -> str:
+        raise NotImplementedError
+
+    async def save_version(self, version: str):
+        raise NotImplementedError
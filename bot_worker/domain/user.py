@@ -4,15 +4,24 @@ class User:
     """
     Domain model representing a bot user.
     """
-    def __init__(self, user_id: int, is_authorized: bool = False):
+    def __init__(self, user_id: int, is_authorized: bool = False, is_registered: bool = False,
+                 sheet_id: str = None):
         self.user_id = user_id
         self.is_authorized = is_authorized
+        # Whether a record exists for this user at all (registered but
+        # possibly not yet authorized).
+        self.is_registered = is_registered
+        # The user's own spreadsheet; None means the deployment default
+        # (GOOGLE_SHEET_ID).
+        self.sheet_id = sheet_id
 
     @classmethod
     def from_dict(cls, user_id: int, data: dict):
         return cls(
             user_id=user_id,
-            is_authorized=data.get("is_authorized", False)
+            is_authorized=data.get("is_authorized", False),
+            is_registered=True,
+            sheet_id=data.get("sheet_id") or None
         )
 
 class UserRepository:
@@ -0,0 +1,243 @@
+"""
+Compact columnar expense ledger for in-memory aggregation.
+
+Rows are stored column-wise in typed arrays instead of one dict per row:
+dates as int32 day numbers (date.toordinal()), categories as small integer
+codes, amounts as float64 and the uncleared flag as a bitmask, so years of
+data fit in a few hundred KB. The gain is memory, not speed: filters and
+sums are plain Python loops over the arrays, not numpy-style vector ops.
+
+Worker copy of shared/libs/expense_ledger.py; edit both.
+tools/worker_harness/check_copies.py fails the deploy if they drift.
+"""
+from array import array
+from datetime import date, datetime
+
+
+def to_day_number(value):
+    """Convert a date, datetime or 'YYYY-MM-DD' string to a day number."""
+    if isinstance(value, datetime):
+        return value.date().toordinal()
+    if isinstance(value, date):
+        return value.toordinal()
+    return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").toordinal()
+
+
+class ExpenseLedger:
+    """
+    Parallel typed arrays holding one expense (or income) row per index.
+    """
+    __slots__ = ('dates', 'categories', 'amounts', 'uncleared', 'descriptions', 'category_names', '_codes')
+
+    def __init__(self, with_descriptions=False):
+        self.dates = array('i')
+        self.categories = array('B')
+        self.amounts = array('d')
+        self.uncleared = bytearray()
+        # Descriptions are optional; aggregation-only ledgers skip them
+        self.descriptions = [] if with_descriptions else None
+        self.category_names = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self.amounts)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def category_code(self, name):
+        """Return the small integer code of a category, registering it if new."""
+        code = self._codes.get(name)
+        if code is None:
+            code = len(self.category_names)
+            if code > 255:
+                raise ValueError("ExpenseLedger supports at most 256 categories")
+            self._codes[name] = code
+            self.category_names.append(name)
+        return code
+
+    def append(self, day, category, amount, uncleared=False, description=None):
+        """Append one row. `day` may be a date, datetime, string or day number."""
+        index = len(self.amounts)
+        self.dates.append(day if isinstance(day, int) else to_day_number(day))
+        self.categories.append(self.category_code(category))
+        self.amounts.append(float(amount))
+        if index % 8 == 0:
+            self.uncleared.append(0)
+        if uncleared:
+            self.uncleared[index >> 3] |= 1 << (index & 7)
+        if self.descriptions is not None:
+            self.descriptions.append(description or "")
+
+    @classmethod
+    def from_records(cls, records, with_descriptions=False):
+        """
+        Build a ledger from record dicts with date, category, amount and
+        uncleared keys. Rows with an unparsable date or amount are skipped.
+        """
+        ledger = cls(with_descriptions=with_descriptions)
+        for r in records:
+            try:
+                day = to_day_number(r.get('date', ''))
+                amount = float(r.get('amount', 0) or 0)
+            except (ValueError, TypeError):
+                continue
+            uncleared = str(r.get('uncleared', '')).strip().upper() in ('TRUE', '1')
+            ledger.append(day, r.get('category') or 'Other', amount, uncleared, r.get('description'))
+        return ledger
+
+    # ------------------------------------------------------------------
+    # Row access
+    # ------------------------------------------------------------------
+
+    def is_uncleared(self, index):
+        return bool(self.uncleared[index >> 3] & (1 << (index & 7)))
+
+    def row(self, index):
+        """Return (date, category, description, amount, uncleared) for one row."""
+        return (
+            date.fromordinal(self.dates[index]),
+            self.category_names[self.categories[index]],
+            self.descriptions[index] if self.descriptions is not None else None,
+            self.amounts[index],
+            self.is_uncleared(index)
+        )
+
+    def rows(self):
+        for i in range(len(self)):
+            yield self.row(i)
+
+    def to_columns(self):
+        """Return the ledger as {column: list} in the processed CSV column order."""
+        return {
+            'date': [date.fromordinal(d) for d in self.dates],
+            'category': [self.category_names[c] for c in self.categories],
+            'description': list(self.descriptions) if self.descriptions is not None else [""] * len(self),
+            'amount': list(self.amounts),
+            'uncleared': [self.is_uncleared(i) for i in range(len(self))]
+        }
+
+    # ------------------------------------------------------------------
+    # Filtering and sorting
+    # ------------------------------------------------------------------
+
+    def _take(self, indices):
+        """Return a new ledger holding only the given row indices, in order."""
+        result = ExpenseLedger(with_descriptions=self.descriptions is not None)
+        result.category_names = list(self.category_names)
+        result._codes = dict(self._codes)
+        result.dates = array('i', (self.dates[i] for i in indices))
+        result.categories = array('B', (self.categories[i] for i in indices))
+        result.amounts = array('d', (self.amounts[i] for i in indices))
+        result.uncleared = bytearray((len(indices) + 7) // 8)
+        for new_index, i in enumerate(indices):
+            if self.is_uncleared(i):
+                result.uncleared[new_index >> 3] |= 1 << (new_index & 7)
+        if self.descriptions is not None:
+            result.descriptions = [self.descriptions[i] for i in indices]
+        return result
+
+    def filter(self, start=None, end=None, categories=None, uncleared=None):
+        """
+        Return the rows matching every given condition.
+
+        Args:
+            start, end: Inclusive date bounds (date, string or day number).
+            categories: Iterable of category names to keep.
+            uncleared: Keep only uncleared (True) or cleared (False) rows.
+        """
+        lo = to_day_number(start) if start is not None and not isinstance(start, int) else start
+        hi = to_day_number(end) if end is not None and not isinstance(end, int) else end
+        codes = None
+        if categories is not None:
+            codes = {self._codes[c] for c in categories if c in self._codes}
+
+        indices = [
+            i for i in range(len(self))
+            if (lo is None or self.dates[i] >= lo)
+            and (hi is None or self.dates[i] <= hi)
+            and (codes is None or self.categories[i] in codes)
+            and (uncleared is None or self.is_uncleared(i) == uncleared)
+        ]
+        return self._take(indices)
+
+    def sorted_by_date(self, reverse=False, tiebreak=None):
+        """
+        Return a copy sorted by date. The sort is stable.
+
+        Args:
+            tiebreak: Optional sequence parallel to the rows used to order
+                      rows that share a date (e.g. the item position in a note).
+        """
+        dates = self.dates
+        if tiebreak is None:
+            key = dates.__getitem__
+        else:
+            key = lambda i: (dates[i], tiebreak[i])
+        return self._take(sorted(range(len(self)), key=key, reverse=reverse))
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    def total(self):
+        return sum(self.amounts)
+
+    def sum_by_category(self):
+        """Return {category: total}."""
+        sums = [0.0] * len(self.category_names)
+        for code, amount in zip(self.categories, self.amounts):
+            sums[code] += amount
+        present = set(self.categories)
+        return {name: sums[code] for code, name in enumerate(self.category_names) if code in present}
+
+    def _month_keys(self):
+        """Map every distinct day number to its 'YYYY-MM' key."""
+        return {day: date.fromordinal(day).strftime("%Y-%m") for day in set(self.dates)}
+
+    def sum_by_month(self):
+        """Return {'YYYY-MM': total}."""
+        months = self._month_keys()
+        sums = {}
+        for day, amount in zip(self.dates, self.amounts):
+            key = months[day]
+            sums[key] = sums.get(key, 0.0) + amount
+        return sums
+
+    def count_by_month(self):
+        """Return {'YYYY-MM': row count}."""
+        months = self._month_keys()
+        counts = {}
+        for day in self.dates:
+            key = months[day]
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def sum_by_month_category(self):
+        """Return {'YYYY-MM': {category: total}}."""
+        month_names = []
+        month_of_day = {}
+        for day, key in sorted(self._month_keys().items()):
+            if not month_names or month_names[-1] != key:
+                month_names.append(key)
+            month_of_day[day] = len(month_names) - 1
+
+        # Accumulate into one flat [month][category] table
+        width = len(self.category_names)
+        sums = [0.0] * (len(month_names) * width)
+        seen = bytearray(len(sums))
+        for day, code, amount in zip(self.dates, self.categories, self.amounts):
+            cell = month_of_day[day] * width + code
+            sums[cell] += amount
+            seen[cell] = 1
+
+        result = {}
+        for m, month in enumerate(month_names):
+            by_cat = {
+                self.category_names[code]: sums[m * width + code]
+                for code in range(width) if seen[m * width + code]
+            }
+            if by_cat:
+                result[month] = by_cat
+        return result
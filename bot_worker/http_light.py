@@ -0,0 +1,129 @@
+"""
+Deadline-aware fetch helper shared by the Telegram, Sheets and OAuth clients.
+
+Every outbound call gets one overall deadline that each attempt's
+AbortSignal is cut from, a bounded retry with backoff on 429/5xx, and for
+idempotent GETs an optional hedged second request. A single hung Google
+call can then no longer hold a webhook request up to the platform limit.
+"""
+import asyncio
+import random
+import time
+import js
+from pyodide.ffi import to_js
+from tracing import span, log
+
+# Overall budget for one logical call, including retries
+DEFAULT_TIMEOUT_MS = 8000
+DEFAULT_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.25
+# Attempts are not started with less time than this left on the deadline
+MIN_ATTEMPT_MS = 250
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+def build_options(method="GET", headers=None, body=None):
+    """
+    Build a fetch() init object. It does not carry a signal, so it can be
+    built once and reused across retries and requests.
+    """
+    init = {"method": method, "headers": headers or {}}
+    if body is not None:
+        init["body"] = body
+    return js.Object.fromEntries(to_js(init))
+
+
+_GET_OPTIONS = build_options("GET")
+
+
+async def _fetch(url, options, timeout_ms, name):
+    # Each attempt gets its own copy of the options with a fresh deadline
+    init = js.Object.assign(js.Object.new(), options)
+    init.signal = js.AbortSignal.timeout(max(int(timeout_ms), 1))
+    with span(name, outbound=True):
+        resp = await js.fetch(url, init)
+        payload = (await resp.json()).to_py()
+    return resp.status, payload
+
+
+async def _hedged_fetch(url, options, timeout_ms, hedge_after_ms, name):
+    """
+    Start a second identical request if the first has not answered after
+    hedge_after_ms, and return whichever succeeds first.
+    """
+    first = asyncio.ensure_future(_fetch(url, options, timeout_ms, name))
+    done, _ = await asyncio.wait({first}, timeout=hedge_after_ms / 1000)
+    if done or timeout_ms - hedge_after_ms < MIN_ATTEMPT_MS:
+        return await first
+
+    second = asyncio.ensure_future(
+        _fetch(url, options, timeout_ms - hedge_after_ms, f"{name} (hedge)")
+    )
+    pending = {first, second}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return task.result()
+    return await first
+
+
+async def fetch_json(url, options=None, *, name, idempotent=False,
+                     timeout_ms=DEFAULT_TIMEOUT_MS, retries=DEFAULT_RETRIES,
+                     hedge_after_ms=None):
+    """
+    Fetch a URL and return its parsed JSON body.
+
+    Args:
+        url: Request URL.
+        options: Init object from build_options (defaults to a plain GET).
+        name: Span name for tracing, e.g. 'sheets.values.get'.
+        idempotent: Whether the request may be repeated safely. Idempotent
+                    requests are retried on 429, 5xx, timeouts and network
+                    errors; others only on 429, which means the request
+                    was not processed.
+        timeout_ms: Overall deadline for all attempts together.
+        retries: Maximum number of retries after the first attempt.
+        hedge_after_ms: For idempotent requests, send a hedged duplicate if
+                    an attempt has not answered after this many ms.
+
+    Returns the last response when retries or the deadline run out.
+
+    Raises:
+        Exception: The last error when no attempt produced a response.
+    """
+    options = options if options is not None else _GET_OPTIONS
+    deadline = time.monotonic() + timeout_ms / 1000
+    attempt = 0
+    response = None
+    while True:
+        remaining_ms = (deadline - time.monotonic()) * 1000
+        try:
+            if hedge_after_ms and idempotent:
+                status, payload = await _hedged_fetch(url, options, remaining_ms, hedge_after_ms, name)
+            else:
+                status, payload = await _fetch(url, options, remaining_ms, name)
+        except Exception as e:
+            if not idempotent or attempt >= retries:
+                raise
+            log("Fetch failed, retrying", level="warning", name=name, error=str(e))
+        else:
+            retryable = status == 429 or (idempotent and status in RETRY_STATUSES)
+            if not retryable or attempt >= retries:
+                return payload
+            response = payload
+            log("Retryable response, retrying", level="warning", name=name, status=status)
+
+        attempt += 1
+        delay = BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)) * (1 + random.random())
+        if (deadline - time.monotonic() - delay) * 1000 < MIN_ATTEMPT_MS:
+            if response is not None:
+                return response
+            raise TimeoutError(f"{name}: deadline exceeded after {attempt} attempt(s)")
+        await asyncio.sleep(delay)
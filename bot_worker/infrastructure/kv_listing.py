@@ -0,0 +1,24 @@
+import js
+from pyodide.ffi import to_js
+
+# Workers KV returns at most this many keys per list() call
+KV_LIST_PAGE_SIZE = 1000
+
+async def list_keys(kv, prefix, limit=None):
+    """
+    Return the names of the keys under a prefix, in key order, following
+    list() cursors. KV listings are eventually consistent, so keys written
+    in the last few seconds may be missing.
+    """
+    names, cursor = [], None
+    while limit is None or len(names) < limit:
+        page_size = KV_LIST_PAGE_SIZE if limit is None else min(limit - len(names), KV_LIST_PAGE_SIZE)
+        options = {"prefix": prefix, "limit": page_size}
+        if cursor:
+            options["cursor"] = cursor
+        listing = (await kv.list(js.Object.fromEntries(to_js(options)))).to_py()
+        names.extend(entry["name"] for entry in listing.get("keys", []))
+        cursor = listing.get("cursor")
+        if listing.get("list_complete", True) or not cursor:
+            break
+    return names
@@ -0,0 +1,81 @@
+import json
+import math
+from domain.monthly_totals import MonthlyTotals, MonthlyTotalsRepository
+from tracing import log
+
+class KVMonthlyTotalsRepository(MonthlyTotalsRepository):
+    """
+    Cloudflare KV implementation of the MonthlyTotalsRepository.
+    Totals are stored as JSON under 'totals:YYYY-MM', or
+    'totals:<scope>:YYYY-MM' for a scoped (per-sheet) repository. The sheet's
+    data version as of the last rebuild is kept under 'totals:[<scope>:]version'
+    so /report can tell stale totals apart with KV reads only.
+    """
+    def __init__(self, kv_namespace, scope=None):
+        self.kv = kv_namespace
+        self.prefix = f"totals:{scope}:" if scope else "totals:"
+
+    async def get(self, month: str) -> MonthlyTotals:
+        """Return the stored totals for a month, or None if not materialized yet."""
+        if not self.kv:
+            return None
+
+        kv_data_str = await self.kv.get(f"{self.prefix}{month}")
+        if not kv_data_str:
+            return None
+
+        try:
+            return MonthlyTotals.from_dict(json.loads(kv_data_str))
+        except Exception as e:
+            log("Error parsing KV totals", level="warning", month=month, error=str(e))
+            return None
+
+    async def save(self, totals: MonthlyTotals):
+        if not self.kv:
+            return
+        await self.kv.put(f"{self.prefix}{totals.month}", json.dumps(totals.to_dict()))
+
+    async def get_version(self) -> str:
+        """Return the data version of the last rebuild, or None."""
+        if not self.kv:
+            return None
+        return await self.kv.get(f"{self.prefix}version")
+
+    async def save_version(self, version: str):
+        if not self.kv:
+            return
+        # No published version (None) is stored as an absent key
+        if version is None:
+            await self.kv.delete(f"{self.prefix}version")
+        else:
+            await self.kv.put(f"{self.prefix}version", version)
+
+    async def apply_records(self, records):
+        """
+        Add freshly recorded rows to their month's totals.
+
+        Only months that have already been materialized (by /reconcile) are
+        updated; unseeded months are left absent so /report falls back to the
+        sheet instead of showing partial totals.
+
+        The update is a KV get, add and put, which KV can't make atomic: of two
+        appends to the same month in flight at once, one can overwrite the
+        other's update. The totals then stay short until the next rebuild by
+        /reconcile or the scheduled warm-up (at most 30 minutes).
+        """
+        by_month = {}
+        for record in records:
+            by_month.setdefault(str(record['date'])[:7], []).append(record)
+
+        for month, month_records in by_month.items():
+            totals = await self.get(month)
+            if totals is None:
+                continue
+            for record in month_records:
+                amount = float(record['amount'])
+                # A NaN or infinite amount would poison the totals for good
+                if not math.isfinite(amount):
+                    log("Skipping non-finite amount in totals", level="warning", month=month)
+                    continue
+                totals.add(record['category'], amount)
+            await self.save(totals)
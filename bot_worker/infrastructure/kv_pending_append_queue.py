@@ -0,0 +1,49 @@
+import json
+import secrets
+import time
+from infrastructure.kv_listing import list_keys
+from tracing import log
+
+class KVPendingAppendQueue:
+    """
+    KV-backed queue of records whose Sheets append was deferred by rate limiting.
+    Records are flushed together with the next allowed append, or by the
+    scheduled warm-up.
+
+    Each deferred batch is stored under its own key,
+    'pending_appends:<scope or ->:<time>-<random>', so concurrent deferrals
+    never overwrite each other. KV has no atomic read-and-delete, so two
+    concurrent drains may both return a batch; that duplicates rows rather
+    than losing them.
+    """
+    KEY = "pending_appends"
+
+    def __init__(self, kv_namespace, scope=None):
+        self.kv = kv_namespace
+        self.prefix = f"{self.KEY}:{scope or '-'}:"
+        # Single-key queue written before batches had their own keys
+        self.legacy_key = f"{self.KEY}:{scope}" if scope else self.KEY
+
+    async def push(self, records):
+        """Store records as a new batch at the end of the queue."""
+        # Millisecond timestamps keep the batches in key (= arrival) order
+        batch_id = f"{int(time.time() * 1000):013d}-{secrets.token_hex(4)}"
+        await self.kv.put(f"{self.prefix}{batch_id}", json.dumps(records))
+
+    async def drain(self):
+        """Return all queued records, oldest batch first, and delete their batches."""
+        pending = await self._take(self.legacy_key)
+        for key in await list_keys(self.kv, self.prefix):
+            pending.extend(await self._take(key))
+        return pending
+
+    async def _take(self, key):
+        kv_data_str = await self.kv.get(key)
+        if not kv_data_str:
+            return []
+        await self.kv.delete(key)
+        try:
+            return json.loads(kv_data_str)
+        except Exception as e:
+            log("Error parsing pending appends", level="warning", error=str(e))
+            return []
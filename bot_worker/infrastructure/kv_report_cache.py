@@ -0,0 +1,21 @@
+import js
+from pyodide.ffi import to_js
+
+class KVReportCache:
+    """
+    Cloudflare KV cache of rendered /report messages, keyed by period
+    (and by scope, for a per-sheet cache).
+    Used to answer rate-limited /report requests without a Sheets call.
+    """
+    TTL_SECONDS = 3600
+
+    def __init__(self, kv_namespace, scope=None):
+        self.kv = kv_namespace
+        self.prefix = f"report:{scope}:" if scope else "report:"
+
+    async def get(self, period: str):
+        return await self.kv.get(f"{self.prefix}{period}")
+
+    async def put(self, period: str, message: str):
+        options = js.Object.fromEntries(to_js({"expirationTtl": self.TTL_SECONDS}))
+        await self.kv.put(f"{self.prefix}{period}", message, options)
@@ -0,0 +1,34 @@
+import json
+import time
+import js
+from pyodide.ffi import to_js
+from tracing import log
+
+class KVAccessTokenCache:
+    """
+    Cloudflare KV copy of Google access tokens, keyed by service account
+    email under 'oauth:<email>'. Lets a cold isolate reuse a token minted
+    by another isolate (or the scheduled warm-up) instead of signing a JWT.
+    """
+    # KV rejects expirationTtl values below 60 seconds
+    MIN_TTL_SECONDS = 60
+
+    def __init__(self, kv_namespace):
+        self.kv = kv_namespace
+
+    async def get(self, email):
+        """Return (token, expiry) or None."""
+        kv_data_str = await self.kv.get(f"oauth:{email}")
+        if not kv_data_str:
+            return None
+        try:
+            data = json.loads(kv_data_str)
+            return data["token"], data["expiry"]
+        except Exception as e:
+            log("Error parsing cached access token", level="warning", error=str(e))
+            return None
+
+    async def put(self, email, token, expiry):
+        ttl = max(int(expiry - time.time()), self.MIN_TTL_SECONDS)
+        options = js.Object.fromEntries(to_js({"expirationTtl": ttl}))
+        await self.kv.put(f"oauth:{email}", json.dumps({"token": token, "expiry": expiry}), options)
@@ -1,5 +1,50 @@
+import asyncio
 import json
+import time
+from collections import OrderedDict
 from domain.user import User, UserRepository
+from infrastructure.kv_listing import list_keys
+from tracing import log
+
+# In-isolate cache of User entities keyed by user_id.
+# Entries live for the lifetime of the Worker isolate, so bursts of messages
+# from the same user are served without touching KV. Negative lookups
+# (unknown or unauthorized users) are cached too, but for a shorter time so
+# newly registered users are picked up quickly.
+USER_CACHE_TTL_SECONDS = 300
+USER_CACHE_NEGATIVE_TTL_SECONDS = 60
+USER_CACHE_MAX_ENTRIES = 256
+
+_user_cache = OrderedDict()
+
+
+def _cache_get(user_id):
+    entry = _user_cache.get(user_id)
+    if entry is None:
+        return None
+    user, expires_at = entry
+    if time.time() >= expires_at:
+        del _user_cache[user_id]
+        return None
+    _user_cache.move_to_end(user_id)
+    return user
+
+
+def _cache_put(user):
+    ttl = USER_CACHE_TTL_SECONDS if user.is_authorized else USER_CACHE_NEGATIVE_TTL_SECONDS
+    _user_cache[user.user_id] = (user, time.time() + ttl)
+    _user_cache.move_to_end(user.user_id)
+    while len(_user_cache) > USER_CACHE_MAX_ENTRIES:
+        _user_cache.popitem(last=False)
+
+
+def invalidate_user_cache(user_id=None):
+    """Drop one cached user, or the whole cache when no ID is given."""
+    if user_id is None:
+        _user_cache.clear()
+    else:
+        _user_cache.pop(user_id, None)
+
 
 class KVUserRepository(UserRepository):
     """
@@ -10,23 +55,47 @@ class KVUserRepository(UserRepository):
 
     async def get_by_id(self, user_id: int) -> User:
         if not self.kv:
-            print("KVUserRepository: No KV namespace binding found.")
+            log("KVUserRepository: No KV namespace binding found", level="warning")
             return User(user_id=user_id, is_authorized=False)
-            
+
+        cached = _cache_get(user_id)
+        if cached is not None:
+            return cached
+
         key = f"user:{user_id}"
-        print(f"KVUserRepository: Fetching key '{key}'")
-        
         kv_data_str = await self.kv.get(key)
-        print(f"KVUserRepository: Raw data from KV for '{key}': {kv_data_str}")
-        
+
         if not kv_data_str:
-            return User(user_id=user_id, is_authorized=False)
+            user = User(user_id=user_id, is_authorized=False)
+            _cache_put(user)
+            return user
             
         try:
             data = json.loads(kv_data_str)
             user = User.from_dict(user_id, data)
-            print(f"KVUserRepository: Parsed user: {user_id}, Authorized: {user.is_authorized}")
-            return user
         except Exception as e:
-            print(f"Error parsing KV data for user {user_id}: {e}")
-            return User(user_id=user_id, is_authorized=False)
+            log("Error parsing KV user record", level="error", error=str(e))
+            user = User(user_id=user_id, is_authorized=False, is_registered=True)
+
+        _cache_put(user)
+        return user
+
+    async def warm_cache(self, limit=USER_CACHE_MAX_ENTRIES):
+        """
+        Load up to `limit` user records into the in-isolate cache.
+        Used by the scheduled warm-up; returns the loaded users.
+        """
+        if not self.kv:
+            return []
+
+        keys = await list_keys(self.kv, "user:", limit)
+        user_ids = []
+        for key in keys:
+            try:
+                user_ids.append(int(key.split(":", 1)[1]))
+            except ValueError:
+                continue
+        # Re-read every record so the cached entries get a fresh TTL
+        for user_id in user_ids:
+            invalidate_user_cache(user_id)
+        return await asyncio.gather(*(self.get_by_id(user_id) for user_id in user_ids))
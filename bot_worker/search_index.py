@@ -0,0 +1,158 @@
+"""
+Inverted keyword index over expense descriptions.
+
+Maps each description word (and the lowercased category) to the ids of the
+expense rows containing it, and keeps per-token monthly sums so a single
+word query is answered without touching the rows at all. Multi-word queries
+intersect the row id lists and sum the matching rows.
+
+The index serializes to one compact JSON blob, published by the fetcher to
+a hidden worksheet and read by the bot's /search command in one request.
+Income rows are not indexed.
+
+Worker copy of shared/libs/search_index.py, which builds the blob on the
+fetcher side. check_copies in tools/worker_harness compares the two.
+"""
+import json
+import re
+
+INDEX_FORMAT_VERSION = 1
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lowercased word tokens, skipping single characters and plain numbers."""
+    return [
+        token for token in TOKEN_PATTERN.findall(str(text).lower())
+        if len(token) > 1 and not token.isdigit()
+    ]
+
+
+class SearchIndex:
+    """
+    Token -> row ids, with per-token {month: [sum, count]} aggregates.
+    Rows are stored as [month id, amount]; months as 'YYYY-MM' strings.
+    """
+    __slots__ = ('months', 'rows', 'tokens', 'sums', '_month_ids')
+
+    def __init__(self):
+        self.months = []
+        self.rows = []
+        self.tokens = {}
+        self.sums = {}
+        self._month_ids = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def add_row(self, row):
+        """
+        Index one ledger row ([date, category, description, amount, ...]).
+        Returns the new row id, or None if the row is income or invalid.
+        """
+        if len(row) < 4 or str(row[1]) == 'Income':
+            return None
+        try:
+            amount = float(str(row[3]).replace('฿', '').replace(',', '') or 0)
+        except ValueError:
+            return None
+
+        month = str(row[0])[:7]
+        month_id = self._month_ids.get(month)
+        if month_id is None:
+            month_id = self._month_ids[month] = len(self.months)
+            self.months.append(month)
+
+        row_id = len(self.rows)
+        self.rows.append([month_id, amount])
+
+        for token in set(tokenize(row[2]) + tokenize(row[1])):
+            self.tokens.setdefault(token, []).append(row_id)
+            entry = self.sums.setdefault(token, {}).setdefault(month, [0.0, 0])
+            entry[0] += amount
+            entry[1] += 1
+        return row_id
+
+    @classmethod
+    def from_rows(cls, rows):
+        index = cls()
+        for row in rows:
+            index.add_row(row)
+        return index
+
+    # ------------------------------------------------------------------
+    # Serialization
+    # ------------------------------------------------------------------
+
+    def to_blob(self):
+        sums = {
+            token: {month: [round(total, 2), count] for month, (total, count) in by_month.items()}
+            for token, by_month in self.sums.items()
+        }
+        return json.dumps({
+            'v': INDEX_FORMAT_VERSION,
+            'months': self.months,
+            'rows': self.rows,
+            'tokens': self.tokens,
+            'sums': sums
+        }, separators=(',', ':'), ensure_ascii=False)
+
+    @classmethod
+    def from_blob(cls, blob):
+        data = json.loads(blob)
+        if data.get('v') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported search index version: {data.get('v')}")
+        index = cls()
+        index.months = data['months']
+        index.rows = data['rows']
+        index.tokens = data['tokens']
+        index.sums = data['sums']
+        index._month_ids = {month: i for i, month in enumerate(index.months)}
+        return index
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def search(self, term, months=None):
+        """
+        Sum the expense rows matching every word of a term.
+
+        Args:
+            term: Search text; all of its tokens must match.
+            months: Optional collection of 'YYYY-MM' months to restrict to.
+
+        Returns:
+            dict: {month: [sum, count]} for the months with matches.
+        """
+        terms = list(dict.fromkeys(tokenize(term)))
+        if not terms:
+            return {}
+
+        if len(terms) == 1:
+            by_month = self.sums.get(terms[0], {})
+            return {
+                month: list(entry) for month, entry in by_month.items()
+                if months is None or month in months
+            }
+
+        postings = [self.tokens.get(token) for token in terms]
+        if not all(postings):
+            return {}
+        postings.sort(key=len)
+        matches = set(postings[0]).intersection(*postings[1:])
+
+        result = {}
+        for row_id in matches:
+            month_id, amount = self.rows[row_id]
+            month = self.months[month_id]
+            if months is not None and month not in months:
+                continue
+            entry = result.setdefault(month, [0.0, 0])
+            entry[0] += amount
+            entry[1] += 1
+        return result
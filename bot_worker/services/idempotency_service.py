@@ -0,0 +1,61 @@
+import asyncio
+import js
+from pyodide.ffi import to_js
+from tracing import log
+
+# How long a processed update_id is remembered. Telegram redelivers within
+# minutes, so a short TTL is enough (KV requires at least 60 seconds).
+PROCESSED_UPDATE_TTL_SECONDS = 600
+
+# update_id -> Future for updates currently being handled in this isolate.
+_in_flight = {}
+
+class IdempotencyService:
+    """
+    Service ensuring each Telegram update is handled at most once.
+    Processed update_ids are recorded in KV with a short TTL, and concurrent
+    deliveries of the same update within an isolate are coalesced.
+    """
+    def __init__(self, kv_namespace):
+        self.kv = kv_namespace
+
+    async def claim(self, update_id) -> bool:
+        """
+        Try to claim an update for processing.
+        Returns False if the update is a duplicate and should be skipped.
+        """
+        if update_id is None:
+            return True
+
+        pending = _in_flight.get(update_id)
+        if pending is not None:
+            # Same update is being handled right now; wait for it instead of
+            # doing the work twice.
+            log("Coalescing duplicate delivery", update_id=update_id)
+            await asyncio.shield(pending)
+            return False
+
+        _in_flight[update_id] = asyncio.get_event_loop().create_future()
+
+        if not self.kv:
+            return True
+
+        try:
+            key = f"update:{update_id}"
+            if await self.kv.get(key):
+                log("Skipping already processed update", update_id=update_id)
+                self.release(update_id)
+                return False
+            options = js.Object.fromEntries(to_js({"expirationTtl": PROCESSED_UPDATE_TTL_SECONDS}))
+            await self.kv.put(key, "1", options)
+        except Exception as e:
+            # Deduplication is best effort; never drop an update because KV failed
+            log("IdempotencyService: KV error", level="warning", update_id=update_id, error=str(e))
+
+        return True
+
+    def release(self, update_id):
+        """Mark an update as finished and wake up coalesced duplicates."""
+        pending = _in_flight.pop(update_id, None)
+        if pending is not None and not pending.done():
+            pending.set_result(True)
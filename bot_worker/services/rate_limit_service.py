@@ -0,0 +1,94 @@
+import json
+import time
+import js
+from pyodide.ffi import to_js
+from tracing import log
+
+# Token buckets protecting the shared service-account Sheets quota.
+# Each bucket holds up to CAPACITY tokens and refills at REFILL_PER_SECOND.
+USER_BUCKET_CAPACITY = 6
+USER_REFILL_PER_SECOND = 6 / 60
+GLOBAL_BUCKET_CAPACITY = 30
+GLOBAL_REFILL_PER_SECOND = 30 / 60
+# A user's bucket is written to KV only once it runs below this many tokens.
+# Until then another isolate starting from a full bucket makes no difference,
+# and skipping the write spares the daily KV write quota.
+USER_BUCKET_PERSIST_BELOW = USER_BUCKET_CAPACITY / 2
+
+# Latest bucket state seen by this isolate. KV is eventually consistent, so a
+# burst hitting one isolate would otherwise read stale token counts.
+_local_buckets = {}
+
+class RateLimitService:
+    """
+    Service applying per-user and global token-bucket limits.
+
+    Per-user buckets are shared between isolates through KV. The global
+    bucket is kept per isolate only: KV takes about one write per second per
+    key, so a shared global key would fail to save during exactly the bursts
+    it is meant to limit. Each isolate thus allows up to the global rate, and
+    Sheets' own 429s (retried by http_light) cover the rest.
+    """
+    def __init__(self, kv_namespace):
+        self.kv = kv_namespace
+
+    async def allow(self, user_id) -> bool:
+        """
+        Take one token from the user's bucket and from the global bucket.
+        Returns False when either bucket is empty.
+        """
+        if not await self._take(f"user:{user_id}", USER_BUCKET_CAPACITY, USER_REFILL_PER_SECOND,
+                                persist_below=USER_BUCKET_PERSIST_BELOW):
+            log("RateLimitService: user is over the limit")
+            return False
+        if not await self._take("global", GLOBAL_BUCKET_CAPACITY, GLOBAL_REFILL_PER_SECOND):
+            log("RateLimitService: global limit reached")
+            return False
+        return True
+
+    async def _take(self, name, capacity, refill_per_second, persist_below=None):
+        """
+        Take one token from a bucket. With persist_below the bucket is also
+        kept in KV, and saved once it is below that many tokens; without it
+        the bucket lives in this isolate only.
+        """
+        key = f"ratelimit:{name}"
+        now = time.time()
+        state = await self._load(key) if persist_below is not None else _local_buckets.get(key)
+
+        tokens = capacity
+        if state:
+            elapsed = max(0.0, now - state["updated"])
+            tokens = min(capacity, state["tokens"] + elapsed * refill_per_second)
+
+        allowed = tokens >= 1
+        if not allowed:
+            # Nothing taken: the stored state already refills to the same count
+            return False
+        tokens -= 1
+
+        state = {"tokens": tokens, "updated": now}
+        _local_buckets[key] = state
+        if self.kv and persist_below is not None and tokens < persist_below:
+            # Expire once the bucket would be full again (KV minimum is 60s)
+            ttl = max(60, int(capacity / refill_per_second) + 1)
+            options = js.Object.fromEntries(to_js({"expirationTtl": ttl}))
+            try:
+                await self.kv.put(key, json.dumps(state), options)
+            except Exception as e:
+                log("RateLimitService: KV error saving bucket", level="warning", bucket=key.split(":", 1)[0], error=str(e))
+        return True
+    async def _load(self, key):
+        local = _local_buckets.get(key)
+        if not self.kv:
+            return local
+        try:
+            kv_data_str = await self.kv.get(key)
+            remote = json.loads(kv_data_str) if kv_data_str else None
+        except Exception as e:
+            log("RateLimitService: KV error loading bucket", level="warning", bucket=key.split(":", 1)[0], error=str(e))
+            remote = None
+        # Prefer whichever state is the most recent
+        if local and (not remote or local["updated"] >= remote["updated"]):
+            return local
+        return remote
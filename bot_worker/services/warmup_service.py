@@ -0,0 +1,81 @@
+import asyncio
+from context import BotContext
+from domain.monthly_totals import MonthlyTotals
+from utils import build_monthly_totals, parse_pivot_rows
+from commands.report import (
+    PIVOT_RANGE, recent_months, parse_report_period, report_cache_key, build_period_message
+)
+from commands.recording import write_records
+from tracing import log
+
+class WarmupService:
+    """
+    Service precomputing, for one spreadsheet, what interactive commands
+    read: the materialized totals and the rendered /report messages of the
+    current and previous month. It first flushes appends that were
+    deferred, so they do not wait for the next interactive append.
+    """
+    def __init__(self, sheets_client, totals_repo=None, report_cache=None, pending_appends=None):
+        self.sheets_client = sheets_client
+        self.totals_repo = totals_repo
+        self.report_cache = report_cache
+        self.pending_appends = pending_appends
+
+    async def warm(self, now=None):
+        """
+        Flush deferred appends, then rebuild both months' totals and cached
+        reports. Returns the number of failed steps (errors are logged, not
+        raised).
+        """
+        months = recent_months(now)
+        results = [await self._flush_pending()]
+        results += await asyncio.gather(
+            self._warm_totals(months), self._warm_reports(months), return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        for error in failures:
+            log("Warm-up step failed", level="warning", sheet_id=self.sheets_client.sheet_id,
+                error=str(error))
+        return len(failures)
+
+    async def _flush_pending(self):
+        """Write deferred records; returns the exception if they stay queued."""
+        if not self.pending_appends:
+            return None
+        # No rate limiter: the scheduled run is the flush of last resort
+        ctx = BotContext(None, None, self.sheets_client, totals_repo=self.totals_repo,
+                         pending_appends=self.pending_appends)
+        try:
+            if not await write_records(ctx, []):
+                return Exception("Deferred records could not be written; left queued")
+        except Exception as e:
+            return e
+        return None
+
+    async def _warm_totals(self, months):
+        if not self.totals_repo:
+            return
+        # Read before the records, as in /reconcile
+        version = await self.sheets_client.get_data_version()
+        for year, month in months:
+            key = f"{year}-{month:02d}"
+            records = await self.sheets_client.get_month_records(key)
+            data = build_monthly_totals(records).get(key, {'expenses': {}, 'income': 0.0, 'count': 0})
+            await self.totals_repo.save(MonthlyTotals(
+                month=key,
+                expenses=data['expenses'],
+                income=data['income'],
+                count=data['count'],
+                version=version
+            ))
+        await self.totals_repo.save_version(version)
+
+    async def _warm_reports(self, months):
+        if not self.report_cache:
+            return
+        pivot = parse_pivot_rows(await self.sheets_client.get_values(PIVOT_RANGE))
+        for year, month in months:
+            period = parse_report_period([f"{month:02d}-{year}"])
+            message = build_period_message(period, pivot)
+            if message:
+                await self.report_cache.put(report_cache_key(period), message)
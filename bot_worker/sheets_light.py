@@ -1,19 +1,97 @@
+import asyncio
 import json
 import js
 import time
 import base64
-from pyodide.ffi import to_js
+import re
+from urllib.parse import quote
+from http_light import fetch_json, build_options, JSON_HEADERS, FORM_HEADERS
+from tracing import log
+from search_index import SearchIndex
+
+# Hidden worksheet mapping each month (YYYY-MM) to its row spans in the
+# expense sheet. Written by the fetcher upload (shared/libs/sheets_client.py)
+# and extended on every bot append.
+MONTH_INDEX_SHEET = "_index"
+
+# Hidden worksheet with the description search index: ['blob', chunk] rows
+# written by the fetcher, followed by ['row', date, category, description,
+# amount] deltas appended by the bot (see search_index.py).
+SEARCH_INDEX_SHEET = "_search"
+
+# Hidden worksheet whose B1 holds the ledger's data version, rewritten by
+# every fetcher upload. Must match DATA_VERSION_WORKSHEET in
+# shared/config/constants.py.
+DATA_VERSION_SHEET = "_meta"
+
+# Per-year worksheet titles used when sharding by year. Must match
+# SHARD_WORKSHEET_FORMAT in shared/config/constants.py.
+SHARD_SHEET_FORMAT = "Expenses {year}"
+LEDGER_HEADER = ["date", "category", "description", "amount", "uncleared"]
+
+SHEETS_API = "https://sheets.googleapis.com/v4/spreadsheets"
+# Idempotent reads that have not answered by then get a hedged duplicate
+SHEETS_HEDGE_AFTER_MS = 2000
+
+# Access tokens shared by every client of the same service account, keyed
+# by client_email, as (token, expiry) tuples. Module-level so they outlive
+# a request and are reused by all tenants' clients in this isolate.
+_access_tokens = {}
+
+# Optional second-level token cache shared across isolates (an object with
+# async get(email) -> (token, expiry) | None and put(email, token, expiry),
+# e.g. infrastructure.kv_token_cache.KVAccessTokenCache).
+_token_store = None
+
+# Tokens closer than this to their expiry are not handed out
+TOKEN_EXPIRY_MARGIN_SECONDS = 60
+
+def set_token_store(store):
+    """Share minted access tokens across isolates through `store`."""
+    global _token_store
+    _token_store = store
+
+# Pooled clients keyed by (sheet_id, shard_by_year); see get_sheets_client.
+_clients = {}
+SHEETS_CLIENT_POOL_MAX = 64
+
+def get_sheets_client(service_account_json, sheet_id, shard_by_year=False):
+    """
+    Return the pooled client for a spreadsheet, creating it on first use.
+    Clients keep their cached request options between requests, and all of
+    them share one access token per service account.
+    """
+    key = (sheet_id, shard_by_year)
+    client = _clients.get(key)
+    if client is None:
+        if len(_clients) >= SHEETS_CLIENT_POOL_MAX:
+            # Evict the oldest tenant; dicts keep insertion order
+            del _clients[next(iter(_clients))]
+        client = _clients[key] = SheetsLightClient(service_account_json, sheet_id, shard_by_year)
+    return client
+
+def _error_matches(result, code, text):
+    """Whether a Sheets API response is an error with this code and message."""
+    error = result.get("error") if isinstance(result, dict) else None
+    if not isinstance(error, dict):
+        return False
+    return error.get("code") == code and text in str(error.get("message", ""))
+
+def _a1(sheet, cells):
+    """Prefix an A1 range with a quoted worksheet title, if any."""
+    return f"'{sheet}'!{cells}" if sheet else cells
 
 class SheetsLightClient:
     """
     Lightweight Google Sheets client for Cloudflare Workers.
     Uses Web Crypto API (via 'js' module) for RS256 signing of JWTs.
     """
-    def __init__(self, service_account_json, sheet_id):
+    def __init__(self, service_account_json, sheet_id, shard_by_year=False):
         self.creds = json.loads(service_account_json)
         self.sheet_id = sheet_id
-        self.access_token = None
-        self.token_expiry = 0
+        self.shard_by_year = shard_by_year
+        self._get_options = None
+        self._options_token = None
 
     def _base64_url_encode(self, data):
         if isinstance(data, dict):
@@ -22,11 +100,42 @@ class SheetsLightClient:
             data = data.encode('utf-8')
         return base64.urlsafe_b64encode(data).decode('utf-8').rstrip('=')
 
-    async def _get_access_token(self):
-        """Exchange Service Account JWT for an access token."""
-        if self.access_token and time.time() < self.token_expiry - 60:
-            return self.access_token
+    async def _get_access_token(self, min_ttl=TOKEN_EXPIRY_MARGIN_SECONDS):
+        """
+        Return the service account's shared access token, valid for at least
+        min_ttl more seconds. Looks in this isolate, then the token store,
+        and only mints a new token when neither has a fresh one.
+        """
+        email = self.creds["client_email"]
+        cached = _access_tokens.get(email)
+        if cached and time.time() < cached[1] - min_ttl:
+            return cached[0]
+
+        if _token_store is not None:
+            try:
+                stored = await _token_store.get(email)
+            except Exception as e:
+                log("Error reading the token store", level="warning", error=str(e))
+                stored = None
+            if stored and time.time() < stored[1] - min_ttl:
+                _access_tokens[email] = stored
+                return stored[0]
+
+        token, expiry = await self._mint_access_token()
+        _access_tokens[email] = (token, expiry)
+        if _token_store is not None:
+            try:
+                await _token_store.put(email, token, expiry)
+            except Exception as e:
+                log("Error writing the token store", level="warning", error=str(e))
+        return token
 
+    async def refresh_access_token(self, min_ttl):
+        """Make sure the shared token stays valid for at least min_ttl seconds."""
+        return await self._get_access_token(min_ttl=min_ttl)
+
+    async def _mint_access_token(self):
+        """Exchange Service Account JWT for an access token and its expiry."""
         # JWT Header and Payload
         header = {"alg": "RS256", "typ": "JWT"}
         now = int(time.time())
@@ -85,71 +194,268 @@ class SheetsLightClient:
         
         signed_jwt = f"{unsigned_jwt}.{signature}"
 
-        # Request the access token
-        options = js.Object.fromEntries(to_js({
-            "method": "POST",
-            "headers": {
-                "Content-Type": "application/x-www-form-urlencoded"
-            },
-            "body": f"grant_type=urn:ietf:params:oauth:grant-type:jwt-bearer&assertion={signed_jwt}"
-        }))
-        resp = await js.fetch("https://oauth2.googleapis.com/token", options)
-        
-        res_data = (await resp.json()).to_py()
+        # Request the access token (a fresh assertion is safe to resend)
+        options = build_options(
+            "POST", FORM_HEADERS,
+            f"grant_type=urn:ietf:params:oauth:grant-type:jwt-bearer&assertion={signed_jwt}"
+        )
+        res_data = await fetch_json(
+            "https://oauth2.googleapis.com/token", options, name="oauth.token", idempotent=True
+        )
         if "access_token" not in res_data:
             raise Exception(f"Failed to get access token: {res_data}")
             
-        self.access_token = res_data["access_token"]
-        self.token_expiry = now + int(res_data.get("expires_in", 3600))
-        return self.access_token
+        return res_data["access_token"], now + int(res_data.get("expires_in", 3600))
+
+    async def _read_options(self):
+        """GET options carrying the bearer token, rebuilt only when it changes."""
+        token = await self._get_access_token()
+        if token != self._options_token:
+            self._get_options = build_options("GET", {"Authorization": f"Bearer {token}"})
+            self._options_token = token
+        return self._get_options
+
+    async def _write_options(self, payload):
+        token = await self._get_access_token()
+        headers = {"Authorization": f"Bearer {token}", **JSON_HEADERS}
+        return build_options("POST", headers, json.dumps(payload))
 
     async def append_row(self, row_data):
         """Append a single row to the sheet."""
-        token = await self._get_access_token()
-        url = f"https://sheets.googleapis.com/v4/spreadsheets/{self.sheet_id}/values/A1:append?valueInputOption=USER_ENTERED"
-        
-        payload = {
-            "values": [row_data]
-        }
-        
-        options = js.Object.fromEntries(to_js({
-            "method": "POST",
-            "headers": {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            },
-            "body": json.dumps(payload)
-        }))
-        
-        resp = await js.fetch(url, options)
-        
-        return (await resp.json()).to_py()
+        return await self.append_rows([row_data])
+
+    def worksheet_for(self, day):
+        """
+        Return the worksheet holding a date or month ('YYYY-MM[-DD]'),
+        or None for the first worksheet when not sharding by year.
+        """
+        if not self.shard_by_year:
+            return None
+        return SHARD_SHEET_FORMAT.format(year=str(day)[:4])
+
+    async def append_rows(self, rows):
+        """
+        Append multiple rows in a single values:append request.
+        When sharding by year, rows are routed to their year's worksheet
+        (one request per year touched, normally just the current one).
+        """
+        shards = {}
+        for row in rows:
+            shards.setdefault(self.worksheet_for(row[0]), []).append(row)
+
+        result = None
+        for sheet, shard_rows in shards.items():
+            result = await self._append_to_sheet(sheet, shard_rows)
+        return result
+
+    async def _post_append(self, sheet, rows):
+        range_name = quote(_a1(sheet, "A1"))
+        url = f"{SHEETS_API}/{self.sheet_id}/values/{range_name}:append?valueInputOption=USER_ENTERED"
+        options = await self._write_options({"values": rows})
+        # Not idempotent: only retried when Sheets rejected it with 429
+        return await fetch_json(url, options, name="sheets.values.append")
+
+    async def _append_to_sheet(self, sheet, rows):
+        result = await self._post_append(sheet, rows)
+
+        # The first append of a new year creates its shard. Only a missing
+        # range means that; any other error (503, 429, ...) is raised so the
+        # rows get queued, and never adds a header to an existing shard.
+        if sheet and _error_matches(result, 400, "Unable to parse range"):
+            added = await self._add_sheet(sheet)
+            if "error" not in added:
+                header = await self._post_append(sheet, [LEDGER_HEADER])
+                if "error" in header:
+                    raise Exception(f"Sheets header append failed: {header['error']}")
+            elif not _error_matches(added, 400, "already exists"):
+                raise Exception(f"Sheets addSheet failed: {added['error']}")
+            # else: a concurrent request created the shard (and its header)
+            result = await self._post_append(sheet, rows)
+        if "error" in result:
+            raise Exception(f"Sheets append failed: {result['error']}")
+
+        # Both indexes are optimizations; update them concurrently and never
+        # fail the append because of them
+        await asyncio.gather(
+            self._index_appended_rows(result, rows, sheet),
+            self._index_search_rows(rows)
+        )
+        return result
+
+    async def _add_sheet(self, title):
+        """Create a worksheet via spreadsheets:batchUpdate and return the response."""
+        url = f"{SHEETS_API}/{self.sheet_id}:batchUpdate"
+        options = await self._write_options({"requests": [{"addSheet": {"properties": {"title": title}}}]})
+        return await fetch_json(url, options, name="sheets.addSheet")
+
+    async def _index_appended_rows(self, append_result, rows, sheet=None):
+        """Record the row spans of freshly appended rows in the month index."""
+        try:
+            await self._append_month_spans(append_result, rows, sheet)
+        except Exception as e:
+            log("Could not update month index", level="warning", error=str(e))
+
+    async def _append_month_spans(self, append_result, rows, sheet):
+        updated_range = append_result.get("updates", {}).get("updatedRange", "")
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        if not match:
+            return
+
+        first_row = int(match.group(1))
+        spans = []
+        for offset, row in enumerate(rows):
+            month = str(row[0])[:7]
+            sheet_row = first_row + offset
+            if spans and spans[-1][0] == month:
+                spans[-1][2] = sheet_row
+            else:
+                spans.append([month, sheet_row, sheet_row, sheet or ""])
+
+        url = f"{SHEETS_API}/{self.sheet_id}/values/{quote(MONTH_INDEX_SHEET)}!A1:append?valueInputOption=RAW"
+        options = await self._write_options({"values": spans})
+        await fetch_json(url, options, name="sheets.index.append")
+
+    async def _index_search_rows(self, rows):
+        """Append freshly written rows to the search index as deltas."""
+        deltas = [["row"] + list(row[:4]) for row in rows]
+        url = f"{SHEETS_API}/{self.sheet_id}/values/{quote(SEARCH_INDEX_SHEET)}!A1:append?valueInputOption=RAW"
+        try:
+            options = await self._write_options({"values": deltas})
+            await fetch_json(url, options, name="sheets.search.append")
+        except Exception as e:
+            log("Could not update search index", level="warning", error=str(e))
+
+    async def get_search_index(self):
+        """
+        Read the search index (published blob plus bot deltas) in one request.
+        Returns a SearchIndex, or None if the fetcher has not published one.
+        """
+        values = await self.get_values(quote(f"{SEARCH_INDEX_SHEET}!A:E"))
+        blob = "".join(str(row[1]) for row in values if len(row) > 1 and row[0] == "blob")
+        if not blob:
+            return None
+
+        index = SearchIndex.from_blob(blob)
+        for row in values:
+            if row and row[0] == "row":
+                index.add_row(row[1:])
+        return index
 
     async def get_values(self, range_name):
         """Fetch raw values from a specific range/sheet."""
-        token = await self._get_access_token()
-        url = f"https://sheets.googleapis.com/v4/spreadsheets/{self.sheet_id}/values/{range_name}?valueRenderOption=UNFORMATTED_VALUE"
-        
-        options = js.Object.fromEntries(to_js({
-            "method": "GET",
-            "headers": {
-                "Authorization": f"Bearer {token}"
-            }
-        }))
-        
-        resp = await js.fetch(url, options)
-        data = (await resp.json()).to_py()
+        url = f"{SHEETS_API}/{self.sheet_id}/values/{range_name}?valueRenderOption=UNFORMATTED_VALUE"
+        data = await fetch_json(
+            url, await self._read_options(), name="sheets.values.get",
+            idempotent=True, hedge_after_ms=SHEETS_HEDGE_AFTER_MS
+        )
         return data.get("values", [])
 
-    async def get_all_records(self):
-        """Fetch all data from the first sheet and return as list of dicts."""
-        values = await self.get_values("A:Z")
+    async def get_data_version(self):
+        """
+        Return the data version the fetcher last published, or None if it
+        never published one. Only the totals rebuild paths read it; /report
+        compares the copy they keep in KV.
+        """
+        url = f"{SHEETS_API}/{self.sheet_id}/values/{DATA_VERSION_SHEET}!B1?valueRenderOption=UNFORMATTED_VALUE"
+        data = await fetch_json(
+            url, await self._read_options(), name="sheets.values.get",
+            idempotent=True, hedge_after_ms=SHEETS_HEDGE_AFTER_MS
+        )
+        # A missing worksheet means no version was published yet; any other
+        # error must not be mistaken for that
+        if "error" in data and not _error_matches(data, 400, "Unable to parse range"):
+            raise Exception(f"Sheets read failed: {data['error']}")
+        values = data.get("values", [])
+        return str(values[0][0]) if values and values[0] else None
+
+    async def batch_get_values(self, ranges):
+        """Fetch several ranges in a single values:batchGet request."""
+        query = "&".join(f"ranges={quote(r)}" for r in ranges)
+        url = f"{SHEETS_API}/{self.sheet_id}/values:batchGet?{query}&valueRenderOption=UNFORMATTED_VALUE"
+        data = await fetch_json(
+            url, await self._read_options(), name="sheets.values.batchGet",
+            idempotent=True, hedge_after_ms=SHEETS_HEDGE_AFTER_MS
+        )
+        return [vr.get("values", []) for vr in data.get("valueRanges", [])]
+
+    async def get_month_spans(self, month):
+        """
+        Look up the row spans of a month ('YYYY-MM') in the month index.
+        Returns a list of (sheet, start_row, end_row), where sheet is None
+        for the first worksheet, or None if no index exists.
+        """
+        index_rows = await self.get_values(f"{MONTH_INDEX_SHEET}!A1:D")
+        if not index_rows:
+            return None
+
+        spans = []
+        for row in index_rows[1:]:
+            if len(row) < 3 or str(row[0]) != month:
+                continue
+            sheet = str(row[3]) if len(row) > 3 and row[3] else None
+            try:
+                spans.append((sheet or "", int(row[1]), int(row[2])))
+            except (ValueError, TypeError):
+                continue
+
+        # Merge overlapping/adjacent spans (appends may extend a span)
+        spans.sort()
+        merged = []
+        for sheet, start, end in spans:
+            if merged and merged[-1][0] == sheet and start <= merged[-1][2] + 1:
+                merged[-1] = (sheet, merged[-1][1], max(merged[-1][2], end))
+            else:
+                merged.append((sheet, start, end))
+        return [(sheet or None, start, end) for sheet, start, end in merged]
+
+    async def get_month_records(self, month):
+        """
+        Fetch only the records of one month ('YYYY-MM') using the month index.
+        Falls back to a full scan of the month's worksheet when the index is
+        missing, so callers should still filter the result by date.
+        """
+        spans = await self.get_month_spans(month)
+        if spans is None:
+            return await self.get_all_records(self.worksheet_for(month))
+        if not spans:
+            return []
+
+        # One header range per worksheet, followed by that sheet's spans
+        sheets = list(dict.fromkeys(sheet for sheet, _, _ in spans))
+        ranges = [_a1(sheet, "A1:Z1") for sheet in sheets]
+        ranges += [_a1(sheet, f"A{start}:Z{end}") for sheet, start, end in spans]
+        value_ranges = await self.batch_get_values(ranges)
+
+        headers = {}
+        for sheet, values in zip(sheets, value_ranges):
+            if values:
+                headers[sheet] = values[0]
+
+        records = []
+        for (sheet, _, _), values in zip(spans, value_ranges[len(sheets):]):
+            header = headers.get(sheet)
+            if not header:
+                continue
+            records.extend(self._to_records(header, values))
+        return records
+
+    async def get_all_records(self, sheet=None):
+        """
+        Fetch all data from a worksheet and return as list of dicts.
+        Defaults to the first sheet, or the current year's shard when
+        sharding by year.
+        """
+        if sheet is None:
+            sheet = self.worksheet_for(time.strftime("%Y"))
+        values = await self.get_values(quote(_a1(sheet, "A:Z")))
         if not values:
             return []
-            
-        header = values[0]
+        return self._to_records(values[0], values[1:])
+
+    @staticmethod
+    def _to_records(header, rows):
         records = []
-        for row in values[1:]:
+        for row in rows:
             record = {}
             for i, h in enumerate(header):
                 val = row[i] if i < len(row) else ""
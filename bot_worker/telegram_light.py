@@ -1,7 +1,9 @@
 import json
-import js
 import re
-from pyodide.ffi import to_js
+from http_light import fetch_json, build_options, JSON_HEADERS
+from tracing import log
+
+MARKDOWN_V2_ESCAPE_PATTERN = re.compile(f"([{re.escape(r'_*[]()~`>#+-=|{}.!')}])")
 
 def escape_markdown_v2(text):
     """
@@ -10,8 +12,7 @@ def escape_markdown_v2(text):
     """
     # Note: \ itself must be escaped first if it's in the text, 
     # but here we are using it as the escape character.
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(escape_chars)}])', r'\\\1', text)
+    return MARKDOWN_V2_ESCAPE_PATTERN.sub(r'\\\1', text)
 
 async def send_telegram_message(token, chat_id, text, reply_markup=None, parse_mode='Markdown', protect_content=False):
     """
@@ -29,18 +30,9 @@ async def send_telegram_message(token, chat_id, text, reply_markup=None, parse_m
     if reply_markup:
         payload['reply_markup'] = reply_markup
         
-    options = js.Object.fromEntries(to_js({
-        "method": "POST",
-        "headers": {
-            "Content-Type": "application/json"
-        },
-        "body": json.dumps(payload)
-    }))
-    
-    response = await js.fetch(url, options)
-    res_json = (await response.json()).to_py()
-    
-    return res_json
+    options = build_options("POST", JSON_HEADERS, json.dumps(payload))
+    # Not idempotent (a resend would duplicate the message): retried on 429 only
+    return await fetch_json(url, options, name="telegram.sendMessage")
 
 async def delete_telegram_message(token, chat_id, message_id):
     """
@@ -53,18 +45,10 @@ async def delete_telegram_message(token, chat_id, message_id):
         'message_id': message_id
     }
     
-    options = js.Object.fromEntries(to_js({
-        "method": "POST",
-        "headers": {
-            "Content-Type": "application/json"
-        },
-        "body": json.dumps(payload)
-    }))
+    options = build_options("POST", JSON_HEADERS, json.dumps(payload))
     
     try:
-        response = await js.fetch(url, options)
-        res_json = (await response.json()).to_py()
-        return res_json
+        return await fetch_json(url, options, name="telegram.deleteMessage", idempotent=True)
     except Exception as e:
-        print(f"Error deleting message: {e}")
+        log("Error deleting message", level="warning", error=str(e))
         return None
@@ -0,0 +1,154 @@
+"""
+Per-request tracing for the Worker.
+
+Each webhook request runs under a Trace. Timed spans around KV operations,
+the OAuth token exchange, Sheets fetches and Telegram calls are collected
+and emitted as a single JSON log line when the request finishes, so Workers
+observability can break a slow request down by where it spent its time.
+"""
+
+import contextvars
+import json
+import random
+import time
+from contextlib import contextmanager
+
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Spans and log events collected while handling one request."""
+    def __init__(self, sampled=True):
+        self.sampled = sampled
+        self.started = time.perf_counter()
+        self.command = None
+        self.fields = {}
+        self.spans = []
+        self.events = []
+        self.outbound_calls = 0
+        self.kv_ops = 0
+        self.has_error = False
+
+    def to_dict(self, status):
+        return {
+            "type": "request",
+            "command": self.command,
+            "status": status,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "outbound_calls": self.outbound_calls,
+            "kv_ops": self.kv_ops,
+            **self.fields,
+            "spans": self.spans,
+            "events": self.events,
+        }
+
+
+def start_trace(sample_rate=1.0):
+    """Begin tracing the current request; only a sample of traces is emitted."""
+    trace = Trace(sampled=random.random() < sample_rate)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def finish_trace(status=200):
+    """
+    Emit the current trace as one JSON log line. Traces that logged an
+    error are always emitted, whether or not they were sampled.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    _current_trace.set(None)
+    if trace.sampled or trace.has_error:
+        print(json.dumps(trace.to_dict(status), default=str))
+
+
+def annotate(**fields):
+    """Attach request-level fields (command, user flags, ...) to the trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    if "command" in fields:
+        trace.command = fields.pop("command")
+    trace.fields.update(fields)
+
+
+@contextmanager
+def span(name, outbound=False):
+    """
+    Time a block as a named span of the current request.
+    Outbound spans count towards the request's outbound call total.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            "name": name,
+            "start_ms": round((started - trace.started) * 1000, 1),
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        if error:
+            record["error"] = error
+        trace.spans.append(record)
+        if outbound:
+            trace.outbound_calls += 1
+        elif name.startswith("kv."):
+            trace.kv_ops += 1
+
+
+def log(message, level="info", **fields):
+    """
+    Structured log event. Inside a request it is attached to the trace;
+    otherwise it is printed immediately as a JSON line.
+    """
+    event = {"level": level, "message": message, **fields}
+    trace = _current_trace.get()
+    if trace is None:
+        print(json.dumps(event, default=str))
+        return
+    if level == "error":
+        trace.has_error = True
+    trace.events.append(event)
+
+
+class TracedKV:
+    """KV namespace wrapper that records every operation as a span."""
+    def __init__(self, kv):
+        self._kv = kv
+
+    @staticmethod
+    def _span_name(op, key):
+        # Only the key prefix is recorded, never user ids
+        return f"kv.{op} {str(key).split(':', 1)[0]}"
+
+    async def get(self, key, *args):
+        with span(self._span_name("get", key)):
+            return await self._kv.get(key, *args)
+
+    async def put(self, key, value, *args):
+        with span(self._span_name("put", key)):
+            return await self._kv.put(key, value, *args)
+
+    async def delete(self, key):
+        with span(self._span_name("delete", key)):
+            return await self._kv.delete(key)
+
+    async def list(self, options=None):
+        prefix = options.prefix if options is not None else ""
+        with span(self._span_name("list", prefix)):
+            return await self._kv.list(options)
@@ -1,5 +1,7 @@
+import math
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
+from expense_ledger import ExpenseLedger
 
 EXPENSE_CATEGORIES = {
     'Shopping': [
@@ -33,63 +35,161 @@ EXPENSE_CATEGORIES = {
     ],
 }
 
-def parse_record_message(text, is_expense=True):
-    """
-    Parse a message for recording income or expense.
-    Expected format: 
-    - /expense <amount> <description> [category]
-    - /income <amount> <description>
-    """
-    # Remove command
-    clean_text = re.sub(r'^/(expense|income)\s*', '', text, flags=re.IGNORECASE).strip()
-    if not clean_text:
+def _categorize(description):
+    """Auto-categorize an expense description using EXPENSE_CATEGORIES keywords."""
+    desc_lower = description.lower()
+    for cat, keywords in EXPENSE_CATEGORIES.items():
+        if any(keyword in desc_lower for keyword in keywords):
+            return cat
+    return 'Other'
+
+def _parse_amount(text):
+    """Parse an amount, or None if it is not a finite number ('nan', 'inf', '1e999')."""
+    try:
+        amount = float(text)
+    except ValueError:
         return None
+    return amount if math.isfinite(amount) else None
+
+def _build_record(amount, description, is_expense, category=None, uncleared=False):
+    """Build a record dict in the column order used by the sheet."""
+    if is_expense:
+        category = category or _categorize(description)
+    else:
+        category = 'Income'
+    return {
+        'date': datetime.now().strftime("%Y-%m-%d"),
+        'category': category,
+        'description': description,
+        'amount': amount,
+        'uncleared': uncleared
+    }
 
+def _parse_amount_first(clean_text, is_expense):
+    """Parse '<amount> <description...> [category]'."""
     # Split by whitespace, max split for description/category
     # Pattern: <amount> <description...> [category]
     parts = clean_text.split()
     if len(parts) < 2:
         return None
 
-    try:
-        amount = float(parts[0])
-    except ValueError:
+    amount = _parse_amount(parts[0])
+    if amount is None:
         return None
 
+    description = " ".join(parts[1:])
+    category = None
     if is_expense:
         # Check if the last word is a known category
-        category = 'Other'
-        description = " ".join(parts[1:])
-        
         last_word = parts[-1].capitalize()
         if last_word in EXPENSE_CATEGORIES:
             category = last_word
             description = " ".join(parts[1:-1])
+
+    return _build_record(amount, description, is_expense, category=category)
+
+def _parse_checklist_item(line, is_expense):
+    """
+    Parse a pasted Keep checklist line: "☐ Description Amount [UNCLEARED]".
+    Mirrors fetcher.expense_processor.parse_expense_line.
+    """
+    clean_line = line.replace("☐", "", 1).strip()
+    if not clean_line:
+        return None
+
+    match = re.search(
+        r'^(.*)\s+(\d+(?:\.\d+)?)(?:\s+UNCLEARED)?.*$',
+        clean_line,
+        re.IGNORECASE
+    )
+    amount = _parse_amount(match.group(2)) if match else None
+    if amount is None:
+        return None
+
+    return _build_record(
+        amount,
+        match.group(1).strip(),
+        is_expense,
+        uncleared="UNCLEARED" in clean_line.upper()
+    )
+
+def parse_record_message(text, is_expense=True):
+    """
+    Parse a message for recording income or expense.
+    Expected format: 
+    - /expense <amount> <description> [category]
+    - /income <amount> <description>
+    """
+    # Remove command
+    clean_text = re.sub(r'^/(expense|income)\s*', '', text, flags=re.IGNORECASE).strip()
+    if not clean_text:
+        return None
+
+    return _parse_amount_first(clean_text, is_expense)
+
+def parse_record_lines(text, is_expense=True):
+    """
+    Parse a possibly multi-line /expense or /income message.
+
+    Every non-empty line is one item, either in the single-item format
+    (<amount> <description> [category]) or as a pasted Keep checklist line
+    ("☐ Description Amount [UNCLEARED]"). Checked items (☑) are skipped.
+
+    Returns:
+        tuple: (records, invalid_lines)
+    """
+    clean_text = re.sub(r'^/(expense|income)\s*', '', text, flags=re.IGNORECASE)
+
+    records = []
+    invalid_lines = []
+    for line in clean_text.split('\n'):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("☑"):
+            continue
+
+        if stripped.startswith("☐"):
+            record = _parse_checklist_item(stripped, is_expense)
         else:
-            # Try to auto-categorize based on description
-            desc_lower = description.lower()
-            for cat, keywords in EXPENSE_CATEGORIES.items():
-                if any(keyword in desc_lower for keyword in keywords):
-                    category = cat
-                    break
-        
-        return {
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'category': category,
-            'description': description,
-            'amount': amount,
-            'uncleared': False  # Default to False for bot entries
-        }
-    else:
-        # Income parsing
-        description = " ".join(parts[1:])
-        return {
-            'date': datetime.now().strftime("%Y-%m-%d"),
-            'category': 'Income',
-            'description': description,
-            'amount': amount,
-            'uncleared': False
-        }
+            record = _parse_amount_first(stripped, is_expense)
+
+        if record:
+            records.append(record)
+        else:
+            invalid_lines.append(stripped)
+
+    return records, invalid_lines
+
+def record_to_row(record):
+    """Convert a record dict to a sheet row."""
+    return [record['date'], record['category'], record['description'], record['amount'], record['uncleared']]
+
+def normalize_sheet_date(value):
+    """
+    Normalize a date cell read from the sheet to 'YYYY-MM-DD'.
+    UNFORMATTED_VALUE reads return dates as serial numbers (days since 1899-12-30).
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (datetime(1899, 12, 30) + timedelta(days=int(value))).strftime("%Y-%m-%d")
+    return str(value or "").strip()[:10]
+
+def build_ledger(records):
+    """Build an ExpenseLedger from sheet records, normalizing serial dates."""
+    return ExpenseLedger.from_records(
+        {**r, 'date': normalize_sheet_date(r.get('date', ''))} for r in records
+    )
+
+def build_monthly_totals(records):
+    """
+    Aggregate sheet records into per-month totals in a single pass.
+    Returns: {'YYYY-MM': {'expenses': {category: amount}, 'income': float, 'count': int}}
+    """
+    ledger = build_ledger(records)
+    counts = ledger.count_by_month()
+    months = {}
+    for month, by_cat in ledger.sum_by_month_category().items():
+        expenses = {cat: amt for cat, amt in by_cat.items() if cat != 'Income'}
+        months[month] = {'expenses': expenses, 'income': by_cat.get('Income', 0.0), 'count': counts[month]}
+    return months
 
 def format_report(records):
     """
@@ -100,25 +200,16 @@ def format_report(records):
 
     # Group by category for the current month
     now = datetime.now()
-    current_month = now.strftime("%Y-%m")
+    month_start = now.date().replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    month_ledger = build_ledger(records).filter(start=month_start, end=next_month - timedelta(days=1))
     
-    month_records = [r for r in records if str(r.get('date', '')).startswith(current_month)]
-    
-    if not month_records:
+    if not len(month_ledger):
         return f"No records found for {now.strftime('%B %Y')}."
 
-    summary = {}
-    total_expense = 0
-    total_income = 0
-
-    for r in month_records:
-        cat = r.get('category', 'Other')
-        amount = float(r.get('amount', 0))
-        if cat == 'Income':
-            total_income += amount
-        else:
-            total_expense += amount
-            summary[cat] = summary.get(cat, 0) + amount
+    summary = month_ledger.sum_by_category()
+    total_income = summary.pop('Income', 0)
+    total_expense = sum(summary.values())
 
     report = f"*Report for {now.strftime('%B %Y')}*\n\n"
     
@@ -133,6 +224,56 @@ def format_report(records):
     
     return report
 
+MONTH_ABBRS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def parse_pivot_rows(values):
+    """
+    Parse every month row of the pivot table in a single pass.
+    Returns: {('2026', 'Feb'): {'summary': {'Food': 123.45, ...}, 'total': 1234.56}, ...}
+    """
+    if not values or len(values) < 3:
+        return {}
+
+    # Row 2 contains headers
+    headers = values[1]
+    # Categories are from column index 2 to second to last (before Grand Total)
+    categories = headers[2:-1]
+
+    months = {}
+    current_year = ""
+    for row in values[2:]:
+        # Update current year if present in Column A
+        if len(row) > 0 and str(row[0]).strip() and "Total" not in str(row[0]):
+            current_year = str(row[0]).strip()
+
+        if len(row) < 2 or not str(row[1]).strip():
+            continue
+
+        summary = {}
+        total_expense = 0
+        # Extract category values (start from index 2)
+        for i, cat in enumerate(categories):
+            val_idx = i + 2
+            if val_idx < len(row):
+                val = row[val_idx]
+                try:
+                    amount = float(val) if val != "" else 0
+                    if amount > 0:
+                        summary[cat] = amount
+                        total_expense += amount
+                except (ValueError, TypeError):
+                    continue
+
+        # Grand Total is the last column
+        try:
+            grand_total = float(row[len(headers)-1]) if len(row) >= len(headers) else total_expense
+        except (ValueError, TypeError):
+            grand_total = total_expense
+
+        months[(current_year, str(row[1]).strip())] = {'summary': summary, 'total': grand_total}
+    return months
+
 def get_pivot_report_data(values, target_month=None, target_year=None):
     """
     Extract structured data from pivot table values.
@@ -143,65 +284,80 @@ def get_pivot_report_data(values, target_month=None, target_year=None):
         'total': 1234.56
     } or None if not found.
     """
-    if not values or len(values) < 3:
-        return None
-
-    # Row 2 contains headers
-    headers = values[1]
-    # Categories are from column index 2 to second to last (before Grand Total)
-    categories = headers[2:-1]
-    
     now = datetime.now()
     if not target_year:
         target_year = now.strftime("%Y")
     if not target_month:
         target_month = now.strftime("%b") # e.g., 'Feb'
-    
-    current_year = ""
-    target_row = None
-    
-    for row in values[2:]:
-        # Update current year if present in Column A
-        if len(row) > 0 and str(row[0]).strip() and "Total" not in str(row[0]):
-            current_year = str(row[0]).strip()
-        
-        # Check if this row matches our target year and month
-        if current_year == target_year and len(row) > 1 and str(row[1]).strip() == target_month:
-            target_row = row
-            break
-            
-    if not target_row:
-        return None
 
-    summary = {}
-    total_expense = 0
-    
-    # Extract category values (start from index 2)
-    for i, cat in enumerate(categories):
-        val_idx = i + 2
-        if val_idx < len(target_row):
-            val = target_row[val_idx]
-            try:
-                amount = float(val) if val != "" else 0
-                if amount > 0:
-                    summary[cat] = amount
-                    total_expense += amount
-            except (ValueError, TypeError):
-                continue
-    
-    # Grand Total is the last column
-    try:
-        grand_total = float(target_row[len(headers)-1]) if len(target_row) >= len(headers) else total_expense
-    except (ValueError, TypeError):
-        grand_total = total_expense
+    month = parse_pivot_rows(values).get((target_year, target_month))
+    if not month:
+        return None
 
     return {
         'month': target_month,
         'year': target_year,
-        'summary': summary,
-        'total': grand_total
+        'summary': month['summary'],
+        'total': month['total']
     }
 
+def month_span(start_year, start_month, end_year, end_month):
+    """List (year, 'Mon') keys from start to end inclusive; months are 1-12."""
+    keys = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        keys.append((str(year), MONTH_ABBRS[month - 1]))
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return keys
+
+def aggregate_pivot_months(months, keys):
+    """
+    Combine several pivot months into one summary.
+    Returns: {
+        'summary': {'Food': 456.0, ...},
+        'total': 7890.12,
+        'monthly': [('Jan', '2026', 1234.56), ...]
+    } or None if none of the months have data.
+    """
+    summary = {}
+    total = 0
+    monthly = []
+    for year, month in keys:
+        data = months.get((year, month))
+        if not data:
+            continue
+        for cat, amount in data['summary'].items():
+            summary[cat] = summary.get(cat, 0) + amount
+        total += data['total']
+        monthly.append((month, year, data['total']))
+
+    if not monthly:
+        return None
+    return {'summary': summary, 'total': total, 'monthly': monthly}
+
+def compare_pivot_months(months, current_key, previous_key):
+    """
+    Month-over-month comparison of two pivot months.
+    Returns: {
+        'rows': [(category, current, previous), ...],
+        'total': (current_total, previous_total)
+    } or None if the current month has no data.
+    """
+    current = months.get(current_key)
+    if not current:
+        return None
+    previous = months.get(previous_key) or {'summary': {}, 'total': 0}
+
+    categories = set(current['summary']) | set(previous['summary'])
+    rows = [
+        (cat, current['summary'].get(cat, 0), previous['summary'].get(cat, 0))
+        for cat in categories
+    ]
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return {'rows': rows, 'total': (current['total'], previous['total'])}
+
 def format_pivot_report(values):
     """
     Format a report from pivot table values.
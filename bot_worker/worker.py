@@ -1,31 +1,128 @@
-import json
+import importlib
 import js
-import logging
 from pyodide.ffi import to_js
 from telegram_light import send_telegram_message
-from sheets_light import SheetsLightClient
 from context import BotContext
-
-# Import command handlers
-from commands.start import handle_start
-from commands.expense import handle_expense
-from commands.income import handle_income
-from commands.report import handle_report
+from tracing import start_trace, finish_trace, annotate, log, TracedKV
 
 # Import DDD components
 from infrastructure.kv_user_repository import KVUserRepository
+from infrastructure.kv_monthly_totals_repository import KVMonthlyTotalsRepository
+from infrastructure.kv_pending_append_queue import KVPendingAppendQueue
+from infrastructure.kv_report_cache import KVReportCache
+from infrastructure.kv_token_cache import KVAccessTokenCache
 from services.auth_service import AuthService
-
-# Setup logging
-logging.basicConfig(level=logging.INFO)
+from services.idempotency_service import IdempotencyService
+from services.rate_limit_service import RateLimitService
+
+# Command route table: prefix -> (module, handler).
+# Command modules are imported on first use so a cold isolate only pays for
+# the command it is serving. Order matters: the first matching prefix wins.
+COMMAND_ROUTES = (
+    ("/start", "commands.start", "handle_start"),
+    ("/expense", "commands.expense", "handle_expense"),
+    ("/income", "commands.income", "handle_income"),
+    ("/report", "commands.report", "handle_report"),
+    ("/reconcile", "commands.reconcile", "handle_reconcile"),
+    ("/search", "commands.search", "handle_search"),
+)
+
+_handlers = {}
+
+def resolve_handler(text):
+    """Return the handler for a message, importing its module on first use."""
+    for prefix, module_name, handler_name in COMMAND_ROUTES:
+        if text.startswith(prefix):
+            annotate(command=prefix)
+            handler = _handlers.get(prefix)
+            if handler is None:
+                module = importlib.import_module(module_name)
+                handler = _handlers[prefix] = getattr(module, handler_name)
+            return handler
+    return None
+
+def _sheets_client(users_kv, sheets_json, sheet_id, shard_by_year):
+    """Return the pooled Sheets client, sharing its access token through KV."""
+    # Imported here so unauthorized requests never load the Sheets client
+    from sheets_light import get_sheets_client, set_token_store
+    if users_kv:
+        set_token_store(KVAccessTokenCache(users_kv))
+    return get_sheets_client(sheets_json, sheet_id, shard_by_year=shard_by_year)
+
+def _sheet_scope(sheet_id, default_sheet_id):
+    """KV scope of sheet-derived state; the default sheet keeps unscoped keys."""
+    return sheet_id if sheet_id != default_sheet_id else None
+
+async def handle_message(users_kv, token, sheets_json, default_sheet_id, chat_id, user_id, text,
+                         shard_by_year=False):
+    """
+    Authenticate the sender and route the message to its command handler.
+    """
+    # Access Control via AuthService (DDD)
+    user_repo = KVUserRepository(users_kv)
+    auth_service = AuthService(user_repo)
+    user = await auth_service.authenticate(user_id)
+
+    # Record the authorization status on the request trace
+    annotate(authorized=user.is_authorized, registered=user.is_registered)
+
+    if not user.is_authorized:
+        error_msg = "🚫 You are not authorized to use this bot." if user.is_registered else "🚫 You are not registered to use this bot."
+        await send_telegram_message(token, chat_id, error_msg)
+        return
+
+    handler = resolve_handler(text)
+    if not handler:
+        return
+
+    # Users with their own spreadsheet get its pooled client; KV state
+    # derived from a sheet (totals, report cache, pending appends) is scoped
+    # to it so tenants never see each other's data. The default sheet keeps
+    # the unscoped keys.
+    sheet_id = user.sheet_id or default_sheet_id
+    scope = _sheet_scope(sheet_id, default_sheet_id)
+    annotate(tenant_sheet=scope is not None)
+
+    sheets_client = _sheets_client(users_kv, sheets_json, sheet_id, shard_by_year)
+    bot_ctx = BotContext(token, chat_id, sheets_client, user_id=user_id)
+    if users_kv:
+        bot_ctx.totals_repo = KVMonthlyTotalsRepository(users_kv, scope=scope)
+        bot_ctx.rate_limiter = RateLimitService(users_kv)
+        bot_ctx.pending_appends = KVPendingAppendQueue(users_kv, scope=scope)
+        bot_ctx.report_cache = KVReportCache(users_kv, scope=scope)
+
+    await handler(bot_ctx, text)
+
+def _shard_by_year(env):
+    return str(getattr(env, "SHEET_SHARD_BY_YEAR", "")).lower() in ("1", "true", "yes")
+
+def _sample_rate(env):
+    """Fraction of requests whose trace is logged (TRACE_SAMPLE_RATE, default 1)."""
+    try:
+        return float(getattr(env, "TRACE_SAMPLE_RATE", None) or 1.0)
+    except (TypeError, ValueError):
+        return 1.0
 
 async def on_fetch(request, env, ctx):
     """
     Cloudflare Worker entry point - Lightweight Webhook Version.
+    Each request is traced and logged as one structured JSON line.
     """
     if request.method != "POST":
         return js.Response.new("Method Not Allowed", js.Object.fromEntries(to_js({"status": 405})))
 
+    start_trace(_sample_rate(env))
+    status = 500
+    try:
+        status = await handle_update(request, env)
+    finally:
+        finish_trace(status)
+
+    body = "OK" if status == 200 else "Internal Config Error"
+    return js.Response.new(body, js.Object.fromEntries(to_js({"status": status})))
+
+async def handle_update(request, env):
+    """Handle one webhook update and return the HTTP status to answer with."""
     try:
         # Use .to_py() to convert the JavaScript proxy object to a Python dict
         data = (await request.json()).to_py()
@@ -40,47 +137,106 @@ async def on_fetch(request, env, ctx):
         # print(f"Message text: {text}, Chat ID: {chat_id}, User ID: {user_id}")
         
         if not chat_id or not user_id:
-            return js.Response.new("OK", js.Object.fromEntries(to_js({"status": 200})))
+            return 200
 
         token = getattr(env, "TELEGRAM_BOT_TOKEN", None)
         sheets_json = getattr(env, "GOOGLE_SERVICE_ACCOUNT_JSON", None)
         default_sheet_id = getattr(env, "GOOGLE_SHEET_ID", None)
         users_kv = getattr(env, "BOT_USERS_KV", None)
+        shard_by_year = _shard_by_year(env)
 
         if not all([token, sheets_json, default_sheet_id]):
-            print("Missing core environment variables!")
-            return js.Response.new("Internal Config Error", js.Object.fromEntries(to_js({"status": 500})))
+            log("Missing core environment variables", level="error")
+            return 500
+
+        if users_kv:
+            users_kv = TracedKV(users_kv)
 
-        # Access Control via AuthService (DDD)
-        user_repo = KVUserRepository(users_kv)
-        auth_service = AuthService(user_repo)
-        user = await auth_service.authenticate(user_id)
+        # Skip Telegram redeliveries of updates we have already handled
+        update_id = data.get("update_id")
+        idempotency = IdempotencyService(users_kv)
+        if not await idempotency.claim(update_id):
+            return 200
 
-        # Log user attempt and their authorization status
-        print(f"User Attempt - ID: {user_id}, Authorized: {user.is_authorized}")
+        try:
+            await handle_message(users_kv, token, sheets_json, default_sheet_id, chat_id, user_id, text,
+                                 shard_by_year=shard_by_year)
+        finally:
+            idempotency.release(update_id)
 
-        if not user.is_authorized:
-            error_msg = "🚫 You are not registered to use this bot." if not users_kv or not await users_kv.get(f"user:{user_id}") else "🚫 You are not authorized to use this bot."
-            await send_telegram_message(token, chat_id, error_msg)
-            return js.Response.new("OK", js.Object.fromEntries(to_js({"status": 200})))
+        return 200
+
+    except Exception as e:
+        # Important: Return 200 OK to Telegram even on error to stop retries.
+        # Errors should be debugged via Cloudflare Workers logs.
+        log("Error handling request", level="error", error=str(e))
+        return 200
 
-        # Use default sheet_id (overrides are no longer supported as per simplification)
-        sheet_id = default_sheet_id
+# ============================================================================
+# Scheduled warm-up (cron trigger, see wrangler.toml)
+# ============================================================================
 
-        sheets_client = SheetsLightClient(sheets_json, sheet_id)
-        bot_ctx = BotContext(token, chat_id, sheets_client)
+# The scheduled run leaves the access token valid for at least this long,
+# so it covers the gap until the next run (cron every 30 minutes)
+WARMUP_TOKEN_MIN_TTL_SECONDS = 40 * 60
 
-        # Basic Router
-        if text.startswith("/start"):
-            await handle_start(bot_ctx)
+async def on_scheduled(controller, env, ctx):
+    """
+    Cron trigger entry point. Refreshes the shared Google access token,
+    warms the user cache, flushes deferred appends and precomputes the current and previous month's
+    totals and reports for every sheet in use, so the first interactive
+    command after an idle period finds warm data in KV.
+    """
+    start_trace(_sample_rate(env))
+    annotate(command="scheduled")
+    status = 500
+    try:
+        status = await run_warmup(env)
+    finally:
+        finish_trace(status)
+
+async def run_warmup(env):
+    """Run the scheduled warm-up and return a status code for the trace."""
+    sheets_json = getattr(env, "GOOGLE_SERVICE_ACCOUNT_JSON", None)
+    default_sheet_id = getattr(env, "GOOGLE_SHEET_ID", None)
+    users_kv = getattr(env, "BOT_USERS_KV", None)
+    if not all([sheets_json, default_sheet_id, users_kv]):
+        log("Missing core environment variables", level="error")
+        return 500
+
+    from services.warmup_service import WarmupService
+    users_kv = TracedKV(users_kv)
+    shard_by_year = _shard_by_year(env)
 
-        elif text.startswith("/report"):
-            await handle_report(bot_ctx, text)
+    try:
+        users = await KVUserRepository(users_kv).warm_cache()
+    except Exception as e:
+        log("Error warming the user cache", level="warning", error=str(e))
+        users = []
 
-        return js.Response.new("OK", js.Object.fromEntries(to_js({"status": 200})))
+    sheet_ids = [default_sheet_id] + sorted({
+        u.sheet_id for u in users if u.is_authorized and u.sheet_id and u.sheet_id != default_sheet_id
+    })
+    annotate(users=len(users), sheets=len(sheet_ids))
 
+    # One token serves every sheet; mint it before the reads need it
+    try:
+        client = _sheets_client(users_kv, sheets_json, default_sheet_id, shard_by_year)
+        await client.refresh_access_token(WARMUP_TOKEN_MIN_TTL_SECONDS)
     except Exception as e:
-        # Important: Return 200 OK to Telegram even on error to stop retries.
-        # Errors should be debugged via Cloudflare Workers logs.
-        print(f"Error handling request: {e}")
-        return js.Response.new("OK", js.Object.fromEntries(to_js({"status": 200})))
+        log("Error refreshing the access token", level="error", error=str(e))
+        return 500
+
+    failures = 0
+    for sheet_id in sheet_ids:
+        scope = _sheet_scope(sheet_id, default_sheet_id)
+        service = WarmupService(
+            _sheets_client(users_kv, sheets_json, sheet_id, shard_by_year),
+            totals_repo=KVMonthlyTotalsRepository(users_kv, scope=scope),
+            report_cache=KVReportCache(users_kv, scope=scope),
+            pending_appends=KVPendingAppendQueue(users_kv, scope=scope)
+        )
+        failures += await service.warm()
+    annotate(failed_steps=failures)
+    return 200 if not failures else 500
+
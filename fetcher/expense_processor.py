@@ -1,12 +1,21 @@
 import os
 import re
+import json
+import time
+from array import array
 from datetime import datetime
 import pandas as pd
+from shared.libs.expense_ledger import ExpenseLedger
+from shared.libs.expense_store import ExpenseStore
+from shared.libs.run_manifest import RunManifest, file_hash
 from shared.config.constants import (
     KEEP_NOTES_CSV,
     EXPENSES_PROCESSED_CSV,
+    EXPENSES_DB,
     EXPENSE_CATEGORIES,
-    OUTPUT_DIR
+    OUTPUT_DIR,
+    CSV_CHUNK_SIZE,
+    KEEP_NOTES_DTYPES
 )
 
 
@@ -24,24 +33,16 @@ def parse_date(date_str):
         return None
 
 
-def parse_expense_line(line):
+def parse_expense_text(text):
     """
-    Extract description and amount from an expense line.
+    Extract description and amount from the text of one expense item.
     
-    Expected format: "☐ Description Amount [UNCLEARED]"
-    Only processes unchecked items (☐). Ignores checked items (☑).
+    Expected format: "Description Amount [UNCLEARED]"
     
     Returns:
         dict or None: {'description': str, 'amount': float, 'uncleared': bool}
     """
-    stripped_line = line.strip()
-    
-    # Only process unchecked items
-    if not stripped_line.startswith("☐"):
-        return None
-
-    # Remove checkbox and clean
-    clean_line = stripped_line.replace("☐", "", 1).strip()
+    clean_line = text.strip()
     if not clean_line:
         return None
 
@@ -63,6 +64,52 @@ def parse_expense_line(line):
     }
 
 
+def parse_expense_line(line):
+    """
+    Extract description and amount from a rendered expense line.
+    
+    Expected format: "☐ Description Amount [UNCLEARED]"
+    Only processes unchecked items (☐). Ignores checked items (☑).
+    
+    Returns:
+        dict or None: {'description': str, 'amount': float, 'uncleared': bool}
+    """
+    stripped_line = line.strip()
+    
+    # Only process unchecked items
+    if not stripped_line.startswith("☐"):
+        return None
+
+    # Remove checkbox and clean
+    return parse_expense_text(stripped_line.replace("☐", "", 1))
+
+
+def iter_note_items(row):
+    """
+    Yield (item_key, sequence, parsed_item) for the unchecked expense items of a note.
+
+    List notes are read structurally from their exported checklist items:
+    the key is the Keep item id and the sequence is the item's position in
+    the note. Plain text notes fall back to parsing rendered '☐' lines.
+    """
+    items_json = getattr(row, 'items', None)
+    if isinstance(items_json, str) and items_json:
+        for position, list_item in enumerate(json.loads(items_json)):
+            if list_item.get('checked'):
+                continue
+            item = parse_expense_text(list_item.get('text', ''))
+            if item:
+                yield list_item['id'], position, item
+        return
+
+    line_number = 0
+    for line in str(row.text).split('\n'):
+        item = parse_expense_line(line)
+        if item:
+            yield f"line:{line_number}", line_number, item
+            line_number += 1
+
+
 def categorize_expense(description):
     """Categorize expense based on keywords in description."""
     desc_lower = description.lower()
@@ -78,58 +125,123 @@ def categorize_expense(description):
 # Main Processing
 # ============================================================================
 
-def process_expenses(input_file=KEEP_NOTES_CSV, output_file=EXPENSES_PROCESSED_CSV):
+def iter_expense_notes(input_file=KEEP_NOTES_CSV, chunksize=CSV_CHUNK_SIZE):
+    """
+    Stream expense-labelled notes from keep_notes.csv chunk by chunk.
+
+    Only the needed columns are read, with explicit dtypes, and each chunk is
+    filtered before the next one is loaded, so memory does not grow with the
+    size of the Keep export.
+
+    Yields:
+        namedtuple rows with id, title, text, items and labels fields.
+    """
+    reader = pd.read_csv(
+        input_file,
+        # Tolerate exports from before the 'items' column existed
+        usecols=lambda column: column in KEEP_NOTES_DTYPES,
+        dtype=KEEP_NOTES_DTYPES,
+        chunksize=chunksize
+    )
+    for chunk in reader:
+        expense_chunk = chunk[chunk['labels'].str.contains('expense', case=False, na=False)]
+        yield from expense_chunk.itertuples(index=False)
+
+def process_expenses(input_file=KEEP_NOTES_CSV, output_file=EXPENSES_PROCESSED_CSV, db_file=EXPENSES_DB):
     """
-    Process expense notes from Keep and export to CSV.
+    Process expense notes from Keep, UPSERT them into the local store and export to CSV.
     
     Args:
         input_file: Path to keep_notes.csv
         output_file: Path to save processed expenses
+        db_file: Path to the SQLite expense store
     """
+    started = time.perf_counter()
     print(f"Reading {input_file}...")
     
-    try:
-        df = pd.read_csv(input_file)
-    except FileNotFoundError:
+    if not os.path.exists(input_file):
         print(f"Error: {input_file} not found.")
         return
 
-    # Filter for expense notes
-    expense_notes = df[df['labels'].str.contains('expense', case=False, na=False)]
-    print(f"Found {len(expense_notes)} expense notes.")
-    
-    # Process each expense note
-    processed_data = []
-    for _, row in expense_notes.iterrows():
-        note_date = parse_date(row['title'])
+    # Skip when the notes are byte-identical to the last processed export
+    manifest = RunManifest()
+    input_hash = file_hash(input_file)
+    previous = manifest.get('process')
+    if manifest.is_unchanged('process', input_hash, output_file) and os.path.exists(db_file):
+        print("Keep notes unchanged since the last run; skipping processing.")
+        manifest.record(
+            'process', input_hash, previous['output_hash'], previous['rows'], started,
+            changed=False, new_items=0, added_amount=0.0
+        )
+        return
+
+    # Process each expense note into a compact columnar ledger
+    ledger = ExpenseLedger(with_descriptions=True)
+    sequences = array('I')
+    store = ExpenseStore(db_file)
+    count_before, total_before = store.totals()
+    note_ids = []
+    note_count = 0
+    for row in iter_expense_notes(input_file):
+        note_count += 1
+        note_date = parse_date(str(row.title))
         if not note_date:
             continue
             
-        # Parse each line in the note and track sequence
-        line_number = 0
-        for line in str(row['text']).split('\n'):
-            item = parse_expense_line(line)
-            if item:
-                processed_data.append({
-                    'date': note_date,
-                    'category': categorize_expense(item['description']),
-                    'description': item['description'],
-                    'amount': item['amount'],
-                    'uncleared': item['uncleared'],
-                    'sequence': line_number
-                })
-                line_number += 1
-
-    if not processed_data:
+        # Parse each item in the note and track its position
+        note_items = []
+        for item_key, sequence, item in iter_note_items(row):
+            category = categorize_expense(item['description'])
+            ledger.append(
+                note_date,
+                category,
+                item['amount'],
+                item['uncleared'],
+                item['description']
+            )
+            sequences.append(sequence)
+            note_items.append({
+                **item,
+                'date': note_date,
+                'category': category,
+                'item_key': item_key,
+                'sequence': sequence
+            })
+
+        store.replace_note_expenses(row.id, note_items)
+        note_ids.append(row.id)
+
+    print(f"Found {note_count} expense notes.")
+
+    # Drop rows of notes that are gone or no longer expense notes
+    pruned = store.prune_expenses(note_ids)
+    if pruned:
+        print(f"Removed {pruned} stale expense rows from the store.")
+
+    # Consumed notes are no longer exported; their rows come from the store
+    consumed_rows = 0
+    for day, category, description, amount, uncleared, sequence in store.iter_consumed_expenses():
+        ledger.append(day, category, amount, uncleared, description)
+        sequences.append(sequence)
+        consumed_rows += 1
+    if consumed_rows:
+        print(f"Kept {consumed_rows} expense items of consumed notes.")
+    count_after, total_after = store.totals()
+    store.close()
+
+    changes = {
+        'new_items': max(count_after - count_before, 0),
+        'added_amount': round(total_after - total_before, 2)
+    }
+
+    if not len(ledger):
         print("No expense items extracted.")
+        manifest.record('process', input_hash, None, 0, started, changed=count_before > 0, **changes)
         return
 
-    # Create DataFrame and sort by date (ascending/oldest first) then sequence (ascending)
-    result_df = pd.DataFrame(processed_data)
-    result_df = result_df.sort_values(by=['date', 'sequence'], ascending=[True, True])
-    
-    # Remove sequence column before saving
-    result_df = result_df.drop(columns=['sequence'])
+    # Sort by date (ascending/oldest first) then sequence (ascending)
+    ledger = ledger.sorted_by_date(tiebreak=sequences)
+    result_df = pd.DataFrame(ledger.to_columns())
     
     # Save to CSV
     os.makedirs(OUTPUT_DIR, exist_ok=True)
@@ -138,6 +250,10 @@ def process_expenses(input_file=KEEP_NOTES_CSV, output_file=EXPENSES_PROCESSED_C
     print(f"Extracted {len(result_df)} expense items.")
     print(f"Saved to {output_file}")
 
+    output_hash = file_hash(output_file)
+    changed = previous is None or previous.get('output_hash') != output_hash
+    manifest.record('process', input_hash, output_hash, len(result_df), started, changed=changed, **changes)
+
 
 if __name__ == "__main__":
     process_expenses()
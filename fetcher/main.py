@@ -1,8 +1,22 @@
 import os
 import sys
+import time
+import argparse
 import getpass
-from shared.libs.keep_client import KeepClient
-from shared.config.constants import OUTPUT_DIR, KEEP_NOTES_CSV
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone
+from shared.libs.keep_client import KeepClient, NOTE_COLUMNS
+from shared.libs.expense_store import ExpenseStore
+from shared.libs.record_writers import CSVRecordWriter, ParquetRecordWriter, iter_batches
+from shared.libs.run_manifest import RunManifest, file_hash
+from shared.config.constants import (
+    KEEP_NOTES_CSV,
+    KEEP_NOTES_PARQUET,
+    KEEP_NOTE_LABELS,
+    CSV_CHUNK_SIZE,
+    KEEP_CONSUME_MODES,
+    KEEP_CONSUME_AFTER_DAYS
+)
 from shared.config.env import ENV
 
 
@@ -125,8 +139,109 @@ def authenticate(client, username):
 # Main Function
 # ============================================================================
 
-def main():
+def consume_synced_notes(client, mode):
+    """
+    Consume mode: archive or label the notes of closed days whose rows are
+    confirmed in Google Sheets, pushing all changes in one Keep sync.
+
+    Only the version of a note recorded by the last upload is consumed, and
+    notes are marked in the store after the sync succeeds, so reruns (and
+    runs after an interrupted one) are safe.
+
+    Returns:
+        int: Number of notes newly marked as consumed.
+    """
+    before = date.today() - timedelta(days=KEEP_CONSUME_AFTER_DAYS - 1)
+    with ExpenseStore() as store:
+        versions = store.consumable_notes(before.isoformat())
+        if not versions:
+            print("No synced notes of closed days to consume.")
+            return 0
+        consumed = client.consume_notes(versions, mode)
+        store.mark_consumed(consumed, datetime.now(timezone.utc).isoformat(timespec='seconds'))
+    print(f"Consumed {len(consumed)} notes ({mode}).")
+    return len(consumed)
+
+
+def export_notes(client, parquet=False, consume_mode=None):
+    """
+    Stream expense notes from the synced client to CSV (and optionally
+    Parquet) and the store, one batch at a time.
+
+    With a consume mode, notes consumed by earlier runs are skipped while
+    they are still archived or labelled; one that reappears (e.g. was
+    unarchived) is exported again and treated as active.
+
+    Returns:
+        int: Number of notes exported.
+    """
+    started = time.perf_counter()
+    print("\nFetching notes...")
+
+    with ExitStack() as stack:
+        store = stack.enter_context(ExpenseStore())
+        consumed = store.consumed_note_ids()
+
+        def _is_consumed(note):
+            return note.id in consumed and client.is_consumed(note, consume_mode)
+
+        exclude = _is_consumed if consume_mode and consumed else None
+        records = client.iter_note_records(labels=KEEP_NOTE_LABELS, exclude=exclude)
+
+        writers = [stack.enter_context(CSVRecordWriter(KEEP_NOTES_CSV, NOTE_COLUMNS))]
+        if parquet:
+            writers.append(stack.enter_context(ParquetRecordWriter(KEEP_NOTES_PARQUET, NOTE_COLUMNS)))
+
+        count = 0
+        for batch in iter_batches(records, CSV_CHUNK_SIZE):
+            for writer in writers:
+                writer.write(batch)
+            # Record notes in the local store
+            store.upsert_notes(record._asdict() for record in batch)
+            store.unmark_consumed(record.id for record in batch if record.id in consumed)
+            count += len(batch)
+
+    print(f"\nFound {count} notes labelled {', '.join(KEEP_NOTE_LABELS)}.")
+    print(f"Saved to {', '.join(writer.path for writer in writers)}")
+
+    # Keep itself is the input; the export hash is what later stages key on
+    manifest = RunManifest()
+    previous = manifest.get('fetch') or {}
+    output_hash = file_hash(KEEP_NOTES_CSV)
+    manifest.record('fetch', None, output_hash, count, started,
+                    changed=previous.get('output_hash') != output_hash)
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Google Keep Fetcher")
+    parser.add_argument(
+        "command", nargs="?", default="run", choices=["run", "watch"],
+        help="'run' fetches once (default); 'watch' keeps syncing until stopped"
+    )
+    parser.add_argument(
+        "--parquet", action="store_true",
+        help=f"Also write notes to {KEEP_NOTES_PARQUET} (requires pyarrow)"
+    )
+    parser.add_argument(
+        "--consume", choices=KEEP_CONSUME_MODES, default=os.environ.get(ENV['KEEP_CONSUME_MODE']) or None,
+        help="Archive or label notes of closed days once their rows are in Google Sheets, "
+             "and skip them in later exports (default: off)"
+    )
+    parser.add_argument(
+        "--interval", type=int, default=300,
+        help="Watch mode: seconds between syncs when notes are changing"
+    )
+    parser.add_argument(
+        "--max-interval", type=int, default=3600,
+        help="Watch mode: upper bound for the backoff when nothing changes"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main entry point for Google Keep Fetcher."""
+    args = parse_args(argv)
     print("Google Keep Fetcher")
     print("-------------------")
     
@@ -134,17 +249,18 @@ def main():
     username = get_username()
     client = KeepClient()
     authenticate(client, username)
+
+    if args.command == "watch":
+        from fetcher.watch import watch
+        watch(client, interval=args.interval, max_interval=args.max_interval,
+              parquet=args.parquet, consume_mode=args.consume)
+        return
     
     # Sync and fetch notes
     client.sync()
-    print("\nFetching notes...")
-    df = client.get_notes_as_dataframe()
-    print(f"\nFound {len(df)} notes.")
-    
-    # Save to CSV
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    df.to_csv(KEEP_NOTES_CSV, index=False)
-    print(f"Saved to {KEEP_NOTES_CSV}")
+    if args.consume:
+        consume_synced_notes(client, args.consume)
+    export_notes(client, parquet=args.parquet, consume_mode=args.consume)
 
 
 if __name__ == "__main__":
@@ -1,25 +1,86 @@
 import os
 import sys
+import time
+import argparse
 import pandas as pd
 from shared.libs.sheets_client import SheetsClient
-from shared.config.constants import EXPENSES_PROCESSED_CSV
+from shared.libs.expense_store import ExpenseStore
+from shared.libs.run_manifest import RunManifest, file_hash
+from shared.config.constants import EXPENSES_PROCESSED_CSV, EXPENSES_DB, EXPENSES_DTYPES, CSV_CHUNK_SIZE
 
-def upload_to_sheets(csv_file=EXPENSES_PROCESSED_CSV):
+def upload_to_sheets(csv_file=EXPENSES_PROCESSED_CSV, db_file=EXPENSES_DB, force=False,
+                     rewrite_past_years=False):
     """
-    Upload CSV data to Google Sheets using the shared SheetsClient.
+    Upload expenses to Google Sheets using the shared SheetsClient.
+    Reads from the local SQLite store, falling back to the processed CSV.
+    Skips the upload, without any Sheets call, when the processed expenses
+    are unchanged since the last successful upload. Either way the store's
+    notes are then marked as uploaded, which consume mode relies on.
     
     Args:
-        csv_file: Path to CSV file to upload
+        csv_file: Path to CSV file to upload when the store is missing
+        db_file: Path to the SQLite expense store
+        force: Upload even if the expenses are unchanged
+        rewrite_past_years: When sharding by year, rewrite every past-year
+                            shard instead of only the ones whose rows changed
     """
-    print(f"Reading data from {csv_file}...")
-    try:
-        df = pd.read_csv(csv_file)
-    except FileNotFoundError:
-        print(f"Error: {csv_file} not found.")
-        sys.exit(1)
+    started = time.perf_counter()
+    manifest = RunManifest()
+    # The processed CSV is written together with the store, so its hash
+    # identifies the data either way
+    input_hash = file_hash(csv_file)
+    previous = manifest.get('upload') or {}
+    if not force and not rewrite_past_years and manifest.is_unchanged('upload', input_hash):
+        print("Expenses unchanged since the last upload; skipping Google Sheets.")
+        manifest.record('upload', input_hash, previous['output_hash'], previous['rows'], started,
+                        changed=False, shard_hashes=previous.get('shard_hashes', {}))
+        mark_uploaded(db_file)
+        return
+
+    if os.path.exists(db_file):
+        print(f"Reading data from {db_file}...")
+        with ExpenseStore(db_file) as store:
+            df = store.read_frame()
+    else:
+        print(f"Reading data from {csv_file}...")
+        try:
+            # The whole ledger is uploaded, but read it with explicit dtypes
+            # and only the ledger columns instead of inferring types
+            chunks = pd.read_csv(
+                csv_file,
+                usecols=list(EXPENSES_DTYPES),
+                dtype=EXPENSES_DTYPES,
+                chunksize=CSV_CHUNK_SIZE
+            )
+            df = pd.concat(chunks, ignore_index=True)
+        except FileNotFoundError:
+            print(f"Error: {csv_file} not found.")
+            sys.exit(1)
 
     client = SheetsClient()
-    client.upload_df(df)
+    # Every shard is either rewritten or confirmed unchanged, so all rows
+    # are in the sheet once this returns
+    shard_hashes = client.upload_df(
+        df, rewrite_past_years=rewrite_past_years, shard_hashes=previous.get('shard_hashes')
+    )
+    manifest.record('upload', input_hash, input_hash, len(df), started, shard_hashes=shard_hashes)
+    mark_uploaded(db_file)
+
+def mark_uploaded(db_file=EXPENSES_DB):
+    """
+    Record that the store's current expense rows are in Google Sheets.
+    Uploads from the CSV fallback mark nothing, so nothing gets consumed.
+    """
+    if not os.path.exists(db_file):
+        return
+    with ExpenseStore(db_file) as store:
+        marked = store.mark_uploaded()
+    print(f"Marked {marked} notes as uploaded.")
 
 if __name__ == "__main__":
-    upload_to_sheets()
+    parser = argparse.ArgumentParser(description="Upload processed expenses to Google Sheets")
+    parser.add_argument("--force", action="store_true", help="Upload even if nothing changed")
+    parser.add_argument("--rewrite-past-years", action="store_true",
+                        help="When sharding by year, rewrite every past-year shard")
+    args = parser.parse_args()
+    upload_to_sheets(force=args.force, rewrite_past_years=args.rewrite_past_years)
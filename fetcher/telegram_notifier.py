@@ -1,40 +1,40 @@
-import pandas as pd
 import os
 from shared.libs.telegram_client import TelegramClient
-from shared.config.constants import EXPENSES_PROCESSED_CSV
+from shared.libs.run_manifest import RunManifest
 from shared.config.env import ENV
 
+def summarize_run(manifest):
+    """
+    Build (status_symbol, status_text) from the run manifest's process and
+    upload entries, without reading the expense data itself.
+    """
+    process = manifest.get('process')
+    if process is None:
+        return "❌", "Sync failed: no processing run recorded."
+    if not process.get('changed'):
+        return "ℹ️", "No changes since the last sync."
+
+    new_items = process.get('new_items', 0)
+    if new_items > 0:
+        status_text = f"{new_items} new item(s), ฿{process.get('added_amount', 0):,.2f} added."
+    else:
+        status_text = f"Expenses updated ({process.get('rows', 0)} items in total)."
+
+    upload = manifest.get('upload')
+    if upload and not upload.get('changed'):
+        status_text += "\nGoogle Sheet already up to date."
+    return "✅", status_text
+
 def send_summary_notification():
     """
-    Read processed expenses and send a summary notification via Telegram.
+    Send a summary of the last sync, read from the run manifest, via Telegram.
     """
     google_sheet_id = os.environ.get(ENV.get('GOOGLE_SHEET_ID'))
     google_sheet_url = f"https://docs.google.com/spreadsheets/d/{google_sheet_id}" if google_sheet_id else None
     github_run_url = os.environ.get('GITHUB_RUN_URL')
     
-    print(f"Reading processed expenses from {EXPENSES_PROCESSED_CSV}...")
-    
-    # Check if file exists to determine sync status
-    exists = os.path.exists(EXPENSES_PROCESSED_CSV)
-    
     tg_client = TelegramClient()
-    
-    if exists:
-        try:
-            df = pd.read_csv(EXPENSES_PROCESSED_CSV)
-            item_count = len(df)
-        except Exception:
-            item_count = 0
-            
-        if item_count > 0:
-            status_symbol = "✅"
-            status_text = "Expenses fetched and synced successfully."
-        else:
-            status_symbol = "ℹ️"
-            status_text = "No new expenses found to process."
-    else:
-        status_symbol = "❌"
-        status_text = "Sync failed: Processed data not found."
+    status_symbol, status_text = summarize_run(RunManifest())
 
     msg = f"{status_symbol} *Expense to Sheets Sync Status*\n\n{status_text}"
     
@@ -0,0 +1,127 @@
+import signal
+import threading
+import time
+from fetcher.main import consume_synced_notes, export_notes
+from fetcher.expense_processor import process_expenses
+from fetcher.sheets_uploader import mark_uploaded
+from shared.libs.expense_store import ExpenseStore
+from shared.libs.sheets_client import SheetsClient, frame_hash
+
+
+# ============================================================================
+# Change Detection
+# ============================================================================
+
+def diff_rows(previous, current):
+    """
+    Compare the previously pushed ledger with the current one.
+
+    Returns:
+        tuple: ('unchanged', None), ('append', new_rows) when the current
+        ledger only adds rows at the end, or ('rewrite', None) otherwise.
+    """
+    if previous == current:
+        return 'unchanged', None
+    if previous is not None and current[:len(previous)] == previous:
+        return 'append', current[len(previous):]
+    return 'rewrite', None
+
+
+# ============================================================================
+# Watch Loop
+# ============================================================================
+
+class Watcher:
+    """
+    Long-running incremental sync: one authenticated KeepClient and one
+    SheetsClient, reused across iterations. Exports and consume mode work
+    as in a single run.
+    """
+    def __init__(self, keep_client, interval=300, max_interval=3600, parquet=False, consume_mode=None):
+        self.keep_client = keep_client
+        self.parquet = parquet
+        self.consume_mode = consume_mode
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.sheets_client = None
+        self.pushed_rows = None
+        self.shard_hashes = None
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        print("\nStop requested, finishing current iteration...")
+        self._stop.set()
+
+    def sync_once(self):
+        """
+        Run one incremental sync and push changed expenses.
+
+        Returns:
+            bool: True if anything was pushed to Sheets.
+        """
+        # gkeepapi keeps its sync version, so this only pulls changes
+        self.keep_client.sync()
+        if self.consume_mode:
+            consume_synced_notes(self.keep_client, self.consume_mode)
+        export_notes(self.keep_client, parquet=self.parquet, consume_mode=self.consume_mode)
+        process_expenses()
+
+        with ExpenseStore() as store:
+            df = store.read_frame()
+        rows = df.fillna('').values.tolist()
+
+        change, new_rows = diff_rows(self.pushed_rows, rows)
+        if change == 'unchanged':
+            print("No expense changes.")
+            return False
+
+        if self.sheets_client is None:
+            self.sheets_client = SheetsClient()
+
+        # Sharded sheets route rows by year; upload_df only rewrites the
+        # current year's shard, so there is no separate append path
+        if change == 'append' and not self.sheets_client.shard_by_year:
+            print(f"Appending {len(new_rows)} new expense rows...")
+            response = self.sheets_client.append_rows(new_rows)
+            if response is None:
+                return False
+            # The bot may have appended rows too, so the indexes are extended
+            # from where the rows actually landed rather than rebuilt from
+            # the store
+            updated_range = response.get('updates', {}).get('updatedRange')
+            self.sheets_client.append_month_spans(updated_range, [r[0] for r in new_rows])
+            self.sheets_client.append_search_rows(new_rows)
+            self.sheets_client.write_data_version(frame_hash(df.fillna('')))
+        else:
+            self.shard_hashes = self.sheets_client.upload_df(df, shard_hashes=self.shard_hashes)
+        self.pushed_rows = rows
+        # Consume mode only archives notes whose rows are confirmed in Sheets
+        mark_uploaded()
+        return True
+
+    def run(self):
+        delay = self.interval
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                changed = self.sync_once()
+            except Exception as e:
+                print(f"Sync failed: {e}")
+                changed = False
+
+            # Back off while nothing changes; snap back as soon as something does
+            delay = self.interval if changed else min(delay * 2, self.max_interval)
+            elapsed = time.monotonic() - started
+            print(f"Next sync in {delay}s (took {elapsed:.1f}s).")
+            self._stop.wait(delay)
+        print("Watch mode stopped.")
+
+
+def watch(keep_client, interval=300, max_interval=3600, parquet=False, consume_mode=None):
+    """Run the fetcher as a daemon until SIGTERM/SIGINT."""
+    watcher = Watcher(keep_client, interval=interval, max_interval=max_interval,
+                      parquet=parquet, consume_mode=consume_mode)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    signal.signal(signal.SIGINT, watcher.stop)
+    print(f"Watching Keep every {interval}s (backing off to {watcher.max_interval}s when idle)...")
+    watcher.run()
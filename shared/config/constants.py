@@ -14,8 +14,41 @@ OUTPUT_DIR = "outputs"
 
 # Output files
 KEEP_NOTES_CSV = f"{OUTPUT_DIR}/keep_notes.csv"
+KEEP_NOTES_PARQUET = f"{OUTPUT_DIR}/keep_notes.parquet"
 EXPENSES_PROCESSED_CSV = f"{OUTPUT_DIR}/expenses_processed.csv"
 
+# SQLite store of notes and parsed expenses (system of record between runs)
+EXPENSES_DB = f"{OUTPUT_DIR}/expenses.db"
+
+# Per-stage input/output hashes of the last pipeline run (see run_manifest.py)
+RUN_MANIFEST = f"{OUTPUT_DIR}/manifest.json"
+
+
+# ============================================================================
+# CSV Reading
+# ============================================================================
+
+# Rows per chunk when streaming CSV files, so peak memory stays flat
+CSV_CHUNK_SIZE = 1000
+
+# Columns of keep_notes.csv needed for expense processing, with explicit dtypes
+KEEP_NOTES_DTYPES = {
+    'id': 'string',
+    'title': 'string',
+    'text': 'string',
+    'items': 'string',
+    'labels': 'string'
+}
+
+# Column dtypes of expenses_processed.csv
+EXPENSES_DTYPES = {
+    'date': 'string',
+    'category': 'string',
+    'description': 'string',
+    'amount': 'float64',
+    'uncleared': 'boolean'
+}
+
 
 # ============================================================================
 # Expense Categories
@@ -54,6 +87,21 @@ EXPENSE_CATEGORIES = {
 }
 
 
+# ============================================================================
+# Keep Export
+# ============================================================================
+
+# Only notes with a label containing one of these names are exported
+KEEP_NOTE_LABELS = ['expense']
+
+# Consume mode (opt-in): notes of closed days whose rows are confirmed in
+# Google Sheets are archived, or labelled KEEP_SYNCED_LABEL, and skipped by
+# later exports. A day is closed once it is this many days in the past.
+KEEP_CONSUME_MODES = ('archive', 'label')
+KEEP_SYNCED_LABEL = 'synced'
+KEEP_CONSUME_AFTER_DAYS = 1
+
+
 # ============================================================================
 # Google Sheets Formatting
 # ============================================================================
@@ -80,6 +128,31 @@ COLUMN_FORMATS = {
     }
 }
 
+# Hidden worksheet mapping each month (YYYY-MM) to its row spans in the
+# expense sheet. Shared with the bot worker (see bot_worker/sheets_light.py).
+# The sheet column is empty for the first worksheet and holds the shard
+# title when sharding by year.
+MONTH_INDEX_WORKSHEET = "_index"
+MONTH_INDEX_HEADER = ["month", "start_row", "end_row", "sheet"]
+
+# Hidden worksheet holding the description search index blob (see
+# shared/libs/search_index.py), split over rows of at most this many
+# characters (a cell holds up to 50,000). Shared with the bot worker.
+SEARCH_INDEX_WORKSHEET = "_search"
+SEARCH_INDEX_CHUNK_CHARS = 40000
+
+# Hidden worksheet whose B1 holds a hash of the uploaded ledger, rewritten
+# by every fetcher upload. The bot stamps its KV totals with it and stops
+# trusting them once it changes. Shared with the bot worker.
+DATA_VERSION_WORKSHEET = "_meta"
+
+# Per-year worksheet titles used when SHEET_SHARD_BY_YEAR is enabled.
+# Shared with the bot worker (see bot_worker/sheets_light.py).
+SHARD_WORKSHEET_FORMAT = "Expenses {year}"
+
+# Rows fetched per request when paging through the expense sheet
+SHEETS_ROW_BLOCK_SIZE = 5000
+
 HEADER_FORMAT = {
     "textFormat": {"bold": True, "fontFamily": "Calibri", "underline": True, "fontSize": 12},
     "horizontalAlignment": "LEFT"
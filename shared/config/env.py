@@ -8,10 +8,12 @@ ENV = {
     'GOOGLE_OAUTH_TOKEN': "GOOGLE_OAUTH_TOKEN",
     'GOOGLE_MASTER_TOKEN': "GOOGLE_MASTER_TOKEN",
     'AUTH_METHOD': "AUTH_METHOD",
+    'KEEP_CONSUME_MODE': "KEEP_CONSUME_MODE",
     
     # Google Sheets Authentication
     'GOOGLE_SERVICE_ACCOUNT_JSON': "GOOGLE_SERVICE_ACCOUNT_JSON",
     'GOOGLE_SHEET_ID': "GOOGLE_SHEET_ID",
+    'SHEET_SHARD_BY_YEAR': "SHEET_SHARD_BY_YEAR",
     
     # CI Detection
     'CI': "CI",
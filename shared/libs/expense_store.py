@@ -0,0 +1,312 @@
+import os
+import sqlite3
+from shared.config.constants import EXPENSES_DB
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    text TEXT,
+    labels TEXT,
+    created TEXT,
+    updated TEXT,
+    archived INTEGER,
+    trashed INTEGER
+);
+
+-- item_key is the Keep list item id (or 'line:<n>' for plain text notes).
+-- (note_id, item_key) is the primary key, which also serves note_id lookups.
+CREATE TABLE IF NOT EXISTS expenses (
+    note_id TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT NOT NULL,
+    amount REAL NOT NULL,
+    uncleared INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (note_id, item_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date);
+
+-- Upload and consume state per note. uploaded_version is notes.updated as
+-- of the last upload that included the note's rows; consumed_at is set once
+-- the note was archived or labelled in Keep (consume mode). Consumed notes
+-- are no longer exported, so their expense rows are kept as they are.
+CREATE TABLE IF NOT EXISTS note_sync (
+    note_id TEXT PRIMARY KEY,
+    uploaded_version TEXT,
+    consumed_at TEXT
+);
+"""
+
+EXPENSE_COLUMNS = ['date', 'category', 'description', 'amount', 'uncleared']
+
+# Bump when the schema changes and add the step to ExpenseStore._migrate.
+# Stores are migrated in place: rows of consumed notes are never exported
+# again, so the store is the only copy of them that can't be rebuilt.
+SCHEMA_VERSION = 2
+
+
+class ExpenseStore:
+    """
+    Local SQLite store of Keep notes and parsed expense rows.
+
+    This is the fetcher's system of record between runs. Parsed items are
+    UPSERTed per note, and the uploader and notifier query it instead of
+    re-reading CSV files.
+    """
+    def __init__(self, path=EXPENSES_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self._migrate()
+        self.conn.executescript(SCHEMA)
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(expenses)")}
+        with self.conn:
+            if columns and 'item_key' not in columns:
+                # Version 1 keyed rows on (note_id, sequence), where sequence
+                # was the line number; 'line:<n>' is the same row's item_key.
+                # Copy into a new table since SQLite can't change a primary
+                # key in place. Dropping the old table drops its indexes, and
+                # SCHEMA recreates them on the new one.
+                self.conn.execute("""
+                    CREATE TABLE expenses_v2 (
+                        note_id TEXT NOT NULL,
+                        item_key TEXT NOT NULL,
+                        sequence INTEGER NOT NULL,
+                        date TEXT NOT NULL,
+                        category TEXT NOT NULL,
+                        description TEXT NOT NULL,
+                        amount REAL NOT NULL,
+                        uncleared INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (note_id, item_key)
+                    )
+                """)
+                self.conn.execute("""
+                    INSERT INTO expenses_v2 (note_id, item_key, sequence, date, category,
+                                             description, amount, uncleared)
+                    SELECT note_id, 'line:' || sequence, sequence, date, category,
+                           description, amount, uncleared
+                    FROM expenses
+                """)
+                self.conn.execute("DROP TABLE expenses")
+                self.conn.execute("ALTER TABLE expenses_v2 RENAME TO expenses")
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def upsert_notes(self, notes):
+        """
+        Insert or update notes.
+
+        Args:
+            notes: Iterable of dicts with id, title, text, labels, created,
+                   updated, archived and trashed keys.
+        """
+        rows = (
+            (
+                n['id'], n.get('title'), n.get('text'), str(n.get('labels', '')),
+                str(n.get('created', '')), str(n.get('updated', '')),
+                int(bool(n.get('archived'))), int(bool(n.get('trashed')))
+            )
+            for n in notes
+        )
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO notes (id, title, text, labels, created, updated, archived, trashed)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    title = excluded.title, text = excluded.text, labels = excluded.labels,
+                    created = excluded.created, updated = excluded.updated,
+                    archived = excluded.archived, trashed = excluded.trashed
+                """,
+                rows
+            )
+
+    def replace_note_expenses(self, note_id, items):
+        """
+        UPSERT the expense rows of one note and drop rows for items that no
+        longer exist in it.
+
+        Args:
+            items: List of dicts with item_key, sequence, date, category,
+                   description, amount and uncleared keys.
+        """
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO expenses (note_id, item_key, sequence, date, category, description, amount, uncleared)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(note_id, item_key) DO UPDATE SET
+                    sequence = excluded.sequence, date = excluded.date,
+                    category = excluded.category, description = excluded.description,
+                    amount = excluded.amount, uncleared = excluded.uncleared
+                """,
+                [
+                    (note_id, i['item_key'], i['sequence'], str(i['date']), i['category'],
+                     i['description'], float(i['amount']), int(bool(i['uncleared'])))
+                    for i in items
+                ]
+            )
+            keys = [i['item_key'] for i in items]
+            placeholders = ", ".join("?" * len(keys))
+            self.conn.execute(
+                f"DELETE FROM expenses WHERE note_id = ? AND item_key NOT IN ({placeholders})",
+                [note_id] + keys
+            )
+
+    def prune_expenses(self, keep_note_ids):
+        """
+        Delete expense rows of notes that are no longer expense notes.
+        Rows of consumed notes are kept, since those notes are not exported.
+        """
+        keep_note_ids = list(keep_note_ids)
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_ids (id TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO keep_ids (id) VALUES (?)", ((i,) for i in keep_note_ids))
+            deleted = self.conn.execute(
+                "DELETE FROM expenses WHERE note_id NOT IN (SELECT id FROM keep_ids) "
+                "AND note_id NOT IN (SELECT note_id FROM note_sync WHERE consumed_at IS NOT NULL)"
+            ).rowcount
+        return deleted
+
+    def mark_uploaded(self):
+        """
+        Record that the current rows of every note with expenses are in
+        Google Sheets, as of each note's stored 'updated' timestamp.
+
+        Returns:
+            int: Number of notes marked.
+        """
+        with self.conn:
+            return self.conn.execute(
+                """
+                INSERT INTO note_sync (note_id, uploaded_version)
+                SELECT id, updated FROM notes WHERE id IN (SELECT note_id FROM expenses)
+                ON CONFLICT(note_id) DO UPDATE SET uploaded_version = excluded.uploaded_version
+                """
+            ).rowcount
+
+    def mark_consumed(self, note_ids, consumed_at):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE note_sync SET consumed_at = ? WHERE note_id = ?",
+                ((str(consumed_at), note_id) for note_id in note_ids)
+            )
+
+    def unmark_consumed(self, note_ids):
+        """Treat notes as active again, e.g. after they were unarchived in Keep."""
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE note_sync SET consumed_at = NULL WHERE note_id = ?",
+                ((note_id,) for note_id in note_ids)
+            )
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def iter_expenses(self, start=None, end=None, category=None):
+        """
+        Yield (date, category, description, amount, uncleared) tuples ordered
+        by date then item order. `start`/`end` are inclusive 'YYYY-MM-DD' bounds.
+        """
+        clauses, params = [], []
+        if start:
+            clauses.append("date >= ?")
+            params.append(str(start))
+        if end:
+            clauses.append("date <= ?")
+            params.append(str(end))
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        cursor = self.conn.execute(
+            f"SELECT date, category, description, amount, uncleared FROM expenses {where} "
+            "ORDER BY date, sequence, note_id",
+            params
+        )
+        for date, category, description, amount, uncleared in cursor:
+            yield date, category, description, amount, bool(uncleared)
+
+    def read_frame(self, start=None, end=None):
+        """Return expenses as a DataFrame in the processed CSV column layout."""
+        import pandas as pd
+        return pd.DataFrame(list(self.iter_expenses(start, end)), columns=EXPENSE_COLUMNS)
+
+    def consumable_notes(self, before):
+        """
+        Return {note_id: uploaded_version} for uploaded, not yet consumed
+        notes whose expenses all fall on days before 'YYYY-MM-DD' `before`.
+        """
+        cursor = self.conn.execute(
+            """
+            SELECT s.note_id, s.uploaded_version FROM note_sync s
+            JOIN expenses e ON e.note_id = s.note_id
+            WHERE s.consumed_at IS NULL AND s.uploaded_version IS NOT NULL
+            GROUP BY s.note_id HAVING MAX(e.date) < ?
+            """,
+            (str(before),)
+        )
+        return dict(cursor.fetchall())
+
+    def consumed_note_ids(self):
+        cursor = self.conn.execute("SELECT note_id FROM note_sync WHERE consumed_at IS NOT NULL")
+        return {note_id for (note_id,) in cursor}
+
+    def iter_consumed_expenses(self):
+        """
+        Yield (date, category, description, amount, uncleared, sequence) rows
+        of consumed notes, which are no longer part of the Keep export.
+        """
+        cursor = self.conn.execute(
+            """
+            SELECT date, category, description, amount, uncleared, sequence FROM expenses
+            WHERE note_id IN (SELECT note_id FROM note_sync WHERE consumed_at IS NOT NULL)
+            ORDER BY date, sequence, note_id
+            """
+        )
+        for date, category, description, amount, uncleared, sequence in cursor:
+            yield date, category, description, amount, bool(uncleared), sequence
+
+    def count_expenses(self):
+        return self.conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+    def totals(self):
+        """Return (row count, amount sum) over all stored expenses."""
+        count, total = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM expenses"
+        ).fetchone()
+        return count, total
+
+    def monthly_totals(self, month):
+        """Return {category: total} for a 'YYYY-MM' month using the date index."""
+        cursor = self.conn.execute(
+            "SELECT category, SUM(amount) FROM expenses WHERE date >= ? AND date < ? GROUP BY category",
+            (f"{month}-01", f"{month}-32")
+        )
+        return dict(cursor.fetchall())
@@ -1,6 +1,34 @@
+import json
+from typing import NamedTuple
 import gkeepapi
 import keyring
 import getpass
+from shared.config.constants import KEEP_SYNCED_LABEL
+
+
+class NoteRecord(NamedTuple):
+    """
+    One exported note. A tuple subclass, so it carries no per-instance dict;
+    the Keep URL is derived from the id on access rather than stored.
+    """
+    id: str
+    title: str
+    text: str
+    items: str
+    created: object
+    updated: object
+    labels: list
+    archived: bool
+    trashed: bool
+
+    @property
+    def url(self):
+        return f"https://keep.google.com/#NOTE/{self.id}"
+
+
+# Column order of keep_notes.csv
+NOTE_COLUMNS = ['id', 'title', 'text', 'items', 'created', 'updated', 'labels', 'archived', 'trashed', 'url']
+
 
 class KeepClient:
     def __init__(self):
@@ -146,26 +174,146 @@ class KeepClient:
         """Returns a list of all notes."""
         return self.keep.all()
 
-    def get_notes_as_dataframe(self):
-        """Returns all notes as a pandas DataFrame."""
+    def find_labels(self, names):
+        """
+        Return the Keep labels whose name contains any of the given names
+        (case-insensitive), e.g. 'expense' matches 'Expenses'.
+        """
+        wanted = [name.lower() for name in names]
+        return [
+            label for label in self.keep.labels()
+            if any(name in label.name.lower() for name in wanted)
+        ]
+
+    def iter_notes(self, labels=None, include_trashed=False, include_archived=True, since=None,
+                   exclude=None):
+        """
+        Iterate over notes, filtered by gkeepapi before anything is materialized.
+
+        Args:
+            labels: Label names to match (see find_labels). None means all notes.
+            include_trashed: Include notes in the trash.
+            include_archived: Include archived notes.
+            since: Only yield notes updated at or after this datetime.
+            exclude: Optional predicate; notes for which it is true are skipped.
+        """
+        label_nodes = None
+        if labels is not None:
+            label_nodes = self.find_labels(labels)
+            # An empty label list would make gkeepapi match unlabeled notes
+            if not label_nodes:
+                return
+
+        notes = self.keep.find(
+            labels=label_nodes,
+            archived=None if include_archived else False,
+            trashed=None if include_trashed else False
+        )
+        for note in notes:
+            if since is not None and note.timestamps.updated < since:
+                continue
+            if exclude is not None and exclude(note):
+                continue
+            yield note
+
+    @staticmethod
+    def get_list_items(note):
+        """
+        Return the checklist items of a List note in display order.
+
+        Reads gkeepapi's ListItem nodes directly instead of the rendered
+        '☐'/'☑' text, giving each item's stable id, text and checked flag.
+        """
+        items = gkeepapi.node.List.sorted_items(note.items)
+        return [
+            {'id': item.id, 'text': item.text, 'checked': item.checked, 'sort': int(item.sort)}
+            for item in items
+        ]
+
+    def iter_note_records(self, labels=None, include_trashed=False, since=None, exclude=None):
+        """
+        Yield a NoteRecord per note, filtered as in iter_notes.
+
+        Records are produced one at a time from gkeepapi's node tree, so
+        callers can stream them to disk without holding every note in memory.
+        List notes carry their checklist items as JSON in 'items' (their
+        'text' is left empty); plain notes keep their text.
+        """
+        notes = self.iter_notes(labels=labels, include_trashed=include_trashed, since=since, exclude=exclude)
+        for note in notes:
+            if isinstance(note, gkeepapi.node.List):
+                text = ''
+                items = json.dumps(self.get_list_items(note), ensure_ascii=False)
+            else:
+                text = note.text
+                items = ''
+            yield NoteRecord(
+                note.id,
+                note.title,
+                text,
+                items,
+                note.timestamps.created,
+                note.timestamps.updated,
+                [label.name for label in note.labels.all()],
+                note.archived,
+                note.trashed
+            )
+
+    @staticmethod
+    def is_consumed(note, mode):
+        """Whether a note is archived ('archive') or carries the synced label ('label')."""
+        if mode == 'archive':
+            return note.archived
+        return any(label.name == KEEP_SYNCED_LABEL for label in note.labels.all())
+
+    def consume_notes(self, versions, mode):
+        """
+        Archive or label notes, then push every change in a single sync.
+
+        Args:
+            versions: {note_id: updated} of the notes to consume. Notes that
+                      were edited since, or are gone or trashed, are skipped
+                      and retried once their new version is uploaded.
+            mode: 'archive' or 'label' (see KEEP_CONSUME_MODES).
+
+        Returns:
+            list: IDs of the notes now consumed, including notes that already
+                  were, so a rerun after an interrupted one is harmless.
+        """
+        label = None
+        if mode == 'label':
+            label = self.keep.findLabel(KEEP_SYNCED_LABEL) or self.keep.createLabel(KEEP_SYNCED_LABEL)
+
+        consumed, changed = [], 0
+        for note_id, version in versions.items():
+            note = self.keep.get(note_id)
+            # Only consume the exact version whose rows were uploaded
+            if note is None or note.trashed or str(note.timestamps.updated) != version:
+                continue
+            if not self.is_consumed(note, mode):
+                if mode == 'archive':
+                    note.archived = True
+                else:
+                    note.labels.add(label)
+                changed += 1
+            consumed.append(note_id)
+
+        if changed:
+            print(f"Consuming {changed} notes...")
+            self.keep.sync()
+        return consumed
+
+    def get_notes_as_dataframe(self, labels=None, include_trashed=False, since=None):
+        """
+        Returns notes as a pandas DataFrame, filtered as in iter_notes.
+        Prefer iter_note_records with a streaming writer for large accounts.
+        """
         import pandas as pd
-        
-        data = []
-        for note in self.keep.all():
-            labels = [label.name for label in note.labels.all()]
-            data.append({
-                'id': note.id,
-                'title': note.title,
-                'text': note.text,
-                'created': note.timestamps.created,
-                'updated': note.timestamps.updated,
-                'labels': labels,
-                'archived': note.archived,
-                'trashed': note.trashed,
-                'url': f"https://keep.google.com/#NOTE/{note.id}"
-            })
-            
-        return pd.DataFrame(data)
+
+        data = ([*record, record.url] for record in
+                self.iter_note_records(labels=labels, include_trashed=include_trashed, since=since))
+        # Explicit columns keep the CSV header even when no note matches
+        return pd.DataFrame.from_records(data, columns=NOTE_COLUMNS)
 
     def print_notes(self):
         """Prints all notes to the console."""
@@ -0,0 +1,112 @@
+"""
+Streaming writers for record iterables (e.g. KeepClient.iter_note_records).
+
+Records are written in fixed-size batches, so memory stays bounded by the
+batch size instead of the number of records. Any object exposing the
+columns as attributes works: NamedTuples, __slots__ classes, and so on.
+"""
+import csv
+import os
+from itertools import islice
+from shared.config.constants import CSV_CHUNK_SIZE
+
+
+def iter_batches(records, batch_size=CSV_CHUNK_SIZE):
+    """Yield lists of up to batch_size records from an iterable."""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class CSVRecordWriter:
+    """Append record batches to a CSV file with a fixed header."""
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.columns)
+        return self
+
+    def write(self, batch):
+        self._writer.writerows(
+            ['' if value is None else value for value in (getattr(r, c) for c in self.columns)]
+            for r in batch
+        )
+        self.count += len(batch)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+
+
+class ParquetRecordWriter:
+    """
+    Append record batches to a Parquet file, one row group per batch.
+    Requires pyarrow, which is imported only when a Parquet file is written.
+    The schema is inferred from the first batch; no file is created when
+    there are no records.
+    """
+    def __init__(self, path, columns):
+        self.path = path
+        self.columns = list(columns)
+        self.count = 0
+        self._writer = None
+        self._pa = None
+        self._pq = None
+
+    def __enter__(self):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet requires pyarrow: pip install pyarrow")
+        self._pa, self._pq = pa, pq
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        return self
+
+    def write(self, batch):
+        pa, pq = self._pa, self._pq
+        table = pa.Table.from_pydict({c: [getattr(r, c) for r in batch] for c in self.columns})
+        if self._writer is None:
+            # The first batch fixes the schema for the whole file; columns
+            # that are all empty so far are assumed to be strings
+            schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in table.schema
+            ])
+            self._writer = pq.ParquetWriter(self.path, schema)
+        self._writer.write_table(table.cast(self._writer.schema))
+        self.count += len(batch)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def open_record_writer(path, columns):
+    """Return a CSV or Parquet writer depending on the file extension."""
+    if path.endswith('.parquet'):
+        return ParquetRecordWriter(path, columns)
+    return CSVRecordWriter(path, columns)
+
+
+def write_records(records, path, columns, batch_size=CSV_CHUNK_SIZE):
+    """
+    Stream records to a CSV or Parquet file in batches.
+
+    Returns:
+        int: Number of records written.
+    """
+    with open_record_writer(path, columns) as writer:
+        for batch in iter_batches(records, batch_size):
+            writer.write(batch)
+    return writer.count
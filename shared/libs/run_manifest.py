@@ -0,0 +1,86 @@
+"""
+Content-addressed run manifest for the fetcher pipeline.
+
+Each stage (fetch -> process -> upload) records the hash of the input it
+consumed, the hash of the output it produced, its row count and timing.
+A stage whose input hash matches its last recorded run can skip its work,
+and the notifier reads what changed from here instead of the data files.
+"""
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from shared.config.constants import RUN_MANIFEST
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents, or None if it does not exist."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    JSON file of {stage: entry}. Entries hold input_hash, output_hash, rows,
+    seconds, changed and finished_at, plus any stage-specific fields.
+    """
+    def __init__(self, path=RUN_MANIFEST):
+        self.path = path
+        self.stages = {}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    self.stages = json.load(f).get('stages', {})
+            except (OSError, ValueError) as e:
+                print(f"Warning: Ignoring unreadable run manifest: {e}")
+
+    def get(self, stage):
+        return self.stages.get(stage)
+
+    def is_unchanged(self, stage, input_hash, output_path=None):
+        """
+        True if the stage last ran on this exact input and, when given,
+        its output file still holds what that run produced.
+        """
+        entry = self.stages.get(stage)
+        if not entry or input_hash is None or entry.get('input_hash') != input_hash:
+            return False
+        if output_path is not None and file_hash(output_path) != entry.get('output_hash'):
+            return False
+        return True
+
+    def record(self, stage, input_hash, output_hash, rows, started, changed=True, **extra):
+        """
+        Record a stage run and save the manifest.
+
+        Args:
+            started: time.perf_counter() value taken when the stage began.
+            changed: False when the stage skipped its work.
+            extra: Stage-specific fields (e.g. new_items, added_amount).
+        """
+        self.stages[stage] = {
+            'input_hash': input_hash,
+            'output_hash': output_hash,
+            'rows': rows,
+            'seconds': round(time.perf_counter() - started, 3),
+            'changed': changed,
+            'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **extra
+        }
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'stages': self.stages}, f, indent=2)
+        # Atomic replace so an interrupted run never leaves a torn manifest
+        os.replace(tmp_path, self.path)
@@ -1,11 +1,83 @@
 import os
+import re
 import sys
 import json
+import hashlib
+from datetime import date, datetime, timedelta
 import gspread
 # pandas is only used in upload_df and is a heavy dependency
 # We move it inside to avoid loading it in Cloudflare Workers
-from shared.config.constants import COLUMN_FORMATS, HEADER_FORMAT
+from shared.config.constants import (
+    COLUMN_FORMATS,
+    HEADER_FORMAT,
+    MONTH_INDEX_WORKSHEET,
+    MONTH_INDEX_HEADER,
+    SHARD_WORKSHEET_FORMAT,
+    SEARCH_INDEX_WORKSHEET,
+    SEARCH_INDEX_CHUNK_CHARS,
+    DATA_VERSION_WORKSHEET,
+    SHEETS_ROW_BLOCK_SIZE
+)
 from shared.config.env import ENV
+from shared.libs.search_index import SearchIndex
+
+
+# ============================================================================
+# Cell Conversion
+# ============================================================================
+
+# Google Sheets serial dates count days from this epoch
+SHEETS_EPOCH = date(1899, 12, 30)
+
+
+def to_date(value):
+    """Convert an unformatted (serial) or formatted date cell to a date."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return SHEETS_EPOCH + timedelta(days=int(value))
+    if not value:
+        return None
+    return datetime.strptime(str(value).strip()[:10], "%Y-%m-%d").date()
+
+
+def to_float(value):
+    if value in ("", None):
+        return 0.0
+    if isinstance(value, str):
+        value = value.replace("฿", "").replace(",", "")
+    return float(value)
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().upper() == "TRUE"
+
+
+# Typed converters for the expense ledger columns; others are kept as-is
+COLUMN_CONVERTERS = {
+    'date': to_date,
+    'amount': to_float,
+    'uncleared': to_bool
+}
+
+A1_ROWS_PATTERN = re.compile(r"^([A-Z]+)(\d+)?:([A-Z]+)(\d+)?$")
+
+
+def frame_hash(part):
+    """SHA-256 of a (filled) DataFrame's rows, e.g. to detect changed shards."""
+    return hashlib.sha256(part.to_csv(index=False).encode('utf-8')).hexdigest()
+
+
+def comparable_row(columns, row):
+    """Normalize a ledger row read from the sheet or a DataFrame for comparison."""
+    values = []
+    for column, value in zip(columns, row):
+        convert = COLUMN_CONVERTERS.get(column)
+        value = convert(value) if convert else value
+        if column == 'amount':
+            value = round(value, 2)
+        values.append(value if convert else str(value))
+    return tuple(values)
 
 class SheetsClient:
     """
@@ -15,7 +87,9 @@ class SheetsClient:
         self.credentials = self._get_credentials()
         self.sheet_id = self._get_sheet_id()
         self.client = self._authenticate()
+        self._spreadsheet = None
         self._worksheet = None
+        self.shard_by_year = os.environ.get(ENV['SHEET_SHARD_BY_YEAR'], '').lower() in ('1', 'true', 'yes')
 
     def _get_credentials(self):
         service_account_json = os.environ.get(ENV['GOOGLE_SERVICE_ACCOUNT_JSON'])
@@ -43,40 +117,239 @@ class SheetsClient:
             sys.exit(1)
 
     @property
-    def worksheet(self):
-        if self._worksheet is None:
+    def spreadsheet(self):
+        if self._spreadsheet is None:
             try:
-                spreadsheet = self.client.open_by_key(self.sheet_id)
-                self._worksheet = spreadsheet.sheet1
+                self._spreadsheet = self.client.open_by_key(self.sheet_id)
             except Exception as e:
                 print(f"Error opening sheet: {e}")
                 sys.exit(1)
+        return self._spreadsheet
+
+    @property
+    def worksheet(self):
+        if self._worksheet is None:
+            self._worksheet = self.spreadsheet.sheet1
         return self._worksheet
 
-    def upload_df(self, df):
-        """Overwrite the entire sheet with DataFrame contents."""
-        import pandas as pd
+    def upload_df(self, df, rewrite_past_years=False, shard_hashes=None):
+        """
+        Overwrite the sheet with DataFrame contents.
+
+        When sharding by year, rows are routed to one worksheet per year and
+        the current year's shard is always rewritten. A past year's shard is
+        only rewritten when its rows changed: its hash differs from the one
+        in shard_hashes or, for years without a hash, its contents differ
+        from the sheet. rewrite_past_years rewrites every shard.
+
+        Returns:
+            dict: {year: frame_hash} of every shard when sharding (pass it
+            back as shard_hashes next time), otherwise {}.
+        """
+        df_filled = df.fillna('')
+        hashes = {}
+        if self.shard_by_year:
+            hashes = self._upload_shards(df_filled, rewrite_past_years, shard_hashes or {})
+        else:
+            self._write_worksheet(self.worksheet, df_filled)
+
+            # The month index is an optimization for the bot; a failure here
+            # must not fail the upload itself.
+            if 'date' in df_filled.columns:
+                try:
+                    self.write_month_index(df_filled['date'].astype(str).tolist())
+                except Exception as e:
+                    print(f"Warning: Could not update month index: {e}")
+
+        # The search index always covers every year, shards included
+        try:
+            columns = ['date', 'category', 'description', 'amount']
+            self.write_search_index(df_filled[columns].values.tolist())
+        except Exception as e:
+            print(f"Warning: Could not update search index: {e}")
+
+        try:
+            self.write_data_version(frame_hash(df_filled))
+        except Exception as e:
+            print(f"Warning: Could not publish the data version; the bot may serve stale totals: {e}")
+        return hashes
+
+    def _upload_shards(self, df_filled, rewrite_past_years, known_hashes):
+        current_year = str(date.today().year)
+        years = df_filled['date'].astype(str).str[:4]
+
+        hashes = {}
+        for year, part in df_filled.groupby(years, sort=True):
+            title = SHARD_WORKSHEET_FORMAT.format(year=year)
+            digest = hashes[year] = frame_hash(part)
+            worksheet, created = self._get_shard_worksheet(title)
+            if year != current_year and not created and not rewrite_past_years:
+                if known_hashes.get(year) == digest:
+                    print(f"Shard '{title}' unchanged; skipping.")
+                    continue
+                if year not in known_hashes and self._shard_matches(year, part):
+                    print(f"Shard '{title}' already matches the data; skipping.")
+                    continue
+
+            print(f"Writing shard '{title}' ({len(part)} rows)...")
+            self._write_worksheet(worksheet, part)
+            try:
+                self.write_month_index(part['date'].astype(str).tolist(), sheet_title=title)
+            except Exception as e:
+                print(f"Warning: Could not update month index: {e}")
+        return hashes
+
+    def _shard_matches(self, year, part):
+        """Whether a shard's rows in the sheet equal the DataFrame slice."""
+        columns = part.columns.tolist()
+        try:
+            sheet_rows = [comparable_row(columns, row) for row in self.iter_rows(columns=columns, year=year)]
+            return sheet_rows == [comparable_row(columns, row) for row in part.itertuples(index=False)]
+        except (ValueError, gspread.exceptions.APIError) as e:
+            print(f"Warning: Could not compare shard {year} with the sheet: {e}")
+            return False
+
+    def _get_shard_worksheet(self, title):
+        """Return (worksheet, created) for a per-year shard."""
+        try:
+            return self.spreadsheet.worksheet(title), False
+        except gspread.exceptions.WorksheetNotFound:
+            return self.spreadsheet.add_worksheet(title=title, rows=1, cols=1), True
+
+    def _write_worksheet(self, worksheet, df_filled):
+        """Clear a worksheet and write a filled DataFrame with formatting."""
         print("Clearing existing data...")
-        self.worksheet.clear()
-        
+        worksheet.clear()
+
         print("Updating sheet with new data...")
         try:
-            df_filled = df.fillna('')
             data = [df_filled.columns.values.tolist()] + df_filled.values.tolist()
-            self.worksheet.update(data, raw=False)
-            
+            worksheet.update(data, raw=False)
+
             # Format header
             last_col_letter = gspread.utils.rowcol_to_a1(1, len(df_filled.columns)).rstrip('1')
             header_range = f"A1:{last_col_letter}1"
-            self.worksheet.format(header_range, HEADER_FORMAT)
-            
+            worksheet.format(header_range, HEADER_FORMAT)
+
             # Format columns
-            self._apply_column_formatting(df_filled)
+            self._apply_column_formatting(df_filled, worksheet)
             print("Sheet updated successfully!")
         except Exception as e:
             print(f"Error updating sheet: {e}")
             sys.exit(1)
 
+    def _get_hidden_worksheet(self, title, cols):
+        """Return a hidden helper worksheet, creating it if needed."""
+        try:
+            return self.spreadsheet.worksheet(title)
+        except gspread.exceptions.WorksheetNotFound:
+            worksheet = self.spreadsheet.add_worksheet(title=title, rows=1, cols=cols)
+            worksheet.hide()
+            return worksheet
+
+    def _get_index_worksheet(self):
+        """Return the hidden month index worksheet, creating it if needed."""
+        return self._get_hidden_worksheet(MONTH_INDEX_WORKSHEET, len(MONTH_INDEX_HEADER))
+
+    def write_search_index(self, rows):
+        """
+        Rebuild the description search index and publish it to its hidden
+        worksheet as ['blob', chunk] rows. This also drops the ['row', ...]
+        deltas the bot appended since the last upload, since those rows are
+        now part of the rebuilt index.
+
+        Args:
+            rows: Ledger rows ([date, category, description, amount, ...]).
+        """
+        blob = SearchIndex.from_rows(rows).to_blob()
+        chunks = [
+            ['blob', blob[i:i + SEARCH_INDEX_CHUNK_CHARS]]
+            for i in range(0, len(blob), SEARCH_INDEX_CHUNK_CHARS)
+        ]
+        search_ws = self._get_hidden_worksheet(SEARCH_INDEX_WORKSHEET, 5)
+        search_ws.clear()
+        search_ws.update(chunks, raw=True)
+        print(f"Search index updated ({len(blob)} bytes in {len(chunks)} chunk(s)).")
+
+    def append_search_rows(self, rows):
+        """
+        Add freshly appended ledger rows to the search index as ['row', ...]
+        deltas, as the bot does, leaving the published blob and the bot's
+        own deltas in place.
+        """
+        search_ws = self._get_hidden_worksheet(SEARCH_INDEX_WORKSHEET, 5)
+        search_ws.append_rows([['row'] + list(row[:4]) for row in rows], value_input_option='RAW')
+
+    def write_data_version(self, version):
+        """
+        Publish the ledger's version marker. The bot compares it with the
+        version its KV totals were built from and falls back to the sheet
+        when they differ, so call this after every change to the ledger.
+        """
+        meta_ws = self._get_hidden_worksheet(DATA_VERSION_WORKSHEET, 2)
+        meta_ws.update([['data_version', version]], 'A1:B1', raw=True)
+        print(f"Data version published ({version[:12]}).")
+
+    def write_month_index(self, dates, sheet_title=None):
+        """
+        Rewrite the month -> row span index for a data sheet.
+
+        Args:
+            dates: Date strings ('YYYY-MM-DD') in sheet order, one per data row.
+                   Data rows start at sheet row 2 (row 1 is the header).
+            sheet_title: Shard worksheet the dates belong to. When set, only
+                   that shard's spans are replaced; other shards are kept.
+        """
+        sheet = sheet_title or ''
+        spans = []
+        for offset, day in enumerate(dates):
+            month = str(day)[:7]
+            row = offset + 2
+            if spans and spans[-1][0] == month and spans[-1][2] == row - 1:
+                spans[-1][2] = row
+            else:
+                spans.append([month, row, row, sheet])
+
+        index_ws = self._get_index_worksheet()
+        if sheet_title:
+            kept = [
+                row for row in index_ws.get_all_values()[1:]
+                if (row[3] if len(row) > 3 else '') != sheet_title
+            ]
+            spans = kept + spans
+        index_ws.clear()
+        index_ws.update([MONTH_INDEX_HEADER] + spans, raw=True)
+        print(f"Month index updated ({len(spans)} spans).")
+
+    def append_month_spans(self, updated_range, dates, sheet_title=None):
+        """
+        Add the row spans of freshly appended rows to the month index.
+
+        The first row is taken from the append response's updatedRange
+        (e.g. "Sheet1!A120:E125"), not from the number of rows we know of,
+        since the bot may have appended rows of its own in between.
+
+        Args:
+            updated_range: updates.updatedRange of the append response.
+            dates: Date strings of the appended rows, in order.
+            sheet_title: Shard worksheet the rows were appended to.
+        """
+        match = re.search(r"![A-Z]+(\d+)", updated_range or '')
+        if not match:
+            print("Month index not updated: append response has no row range.")
+            return
+        first_row = int(match.group(1))
+        spans = []
+        for offset, day in enumerate(dates):
+            month = str(day)[:7]
+            row = first_row + offset
+            if spans and spans[-1][0] == month:
+                spans[-1][2] = row
+            else:
+                spans.append([month, row, row, sheet_title or ''])
+        self._get_index_worksheet().append_rows(spans, value_input_option='RAW')
+        print(f"Month index extended ({len(spans)} spans).")
+
     def append_row(self, row_data):
         """Append a single row of data to the sheet."""
         try:
@@ -88,15 +361,123 @@ class SheetsClient:
             print(f"Error appending row: {e}")
             return False
 
-    def get_all_records(self):
-        """Fetch all data from the sheet as a list of dicts."""
+    def append_rows(self, rows):
+        """
+        Append several rows of data to the sheet in one request.
+
+        Returns:
+            dict: The append response (its updates.updatedRange locates the
+            new rows), or None if the append failed.
+        """
         try:
-            return self.worksheet.get_all_records()
+            response = self.worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+            print(f"{len(rows)} rows appended successfully.")
+            return response
+        except Exception as e:
+            print(f"Error appending rows: {e}")
+            return None
+
+    def data_worksheet(self, year=None):
+        """
+        Return the worksheet holding the expense rows: sheet1, or when
+        sharding by year the shard of `year` (default: the current year).
+        """
+        if not self.shard_by_year:
+            return self.worksheet
+        title = SHARD_WORKSHEET_FORMAT.format(year=year or date.today().year)
+        return self.spreadsheet.worksheet(title)
+
+    def get_all_records(self, year=None):
+        """Fetch all data from the data sheet (see data_worksheet) as a list of dicts."""
+        try:
+            return self.data_worksheet(year).get_all_records()
         except Exception as e:
             print(f"Error fetching records: {e}")
             return []
 
-    def _apply_column_formatting(self, df):
+    def get_header(self, year=None):
+        """Return the header row of the data sheet (see data_worksheet)."""
+        values = self._values_get(f"'{self.data_worksheet(year).title}'!1:1", 'FORMATTED_VALUE')
+        return values[0] if values else []
+
+    def _values_get(self, range_name, value_render):
+        result = self.spreadsheet.values_get(range_name, params={'valueRenderOption': value_render})
+        return result.get('values', [])
+
+    def iter_rows(self, range_name=None, columns=None, value_render='UNFORMATTED_VALUE',
+                  block_size=SHEETS_ROW_BLOCK_SIZE, year=None):
+        """
+        Stream typed rows from the expense sheet, one block of rows per request.
+
+        Args:
+            range_name: Optional A1 range on the data sheet (e.g. 'A2:E20000')
+                        limiting the rows read. Defaults to every data row.
+            columns: Header names to yield, in order. Defaults to all columns.
+            value_render: Sheets valueRenderOption.
+            block_size: Rows fetched per request.
+            year: Shard to read when sharding by year (see data_worksheet).
+
+        Yields:
+            tuple: One value per requested column. date, amount and uncleared
+            are converted to date, float and bool.
+
+        Raises:
+            ValueError: A column is not in the header or outside range_name.
+        """
+        title = self.data_worksheet(year).title
+        header = self.get_header(year)
+        if columns is None:
+            columns = header
+        missing = [c for c in columns if c not in header]
+        if missing:
+            raise ValueError(f"Columns not in the sheet header: {', '.join(missing)}")
+        indices = [header.index(c) for c in columns]
+        converters = [COLUMN_CONVERTERS.get(c) for c in columns]
+
+        first_col, last_col = "A", gspread.utils.rowcol_to_a1(1, max(len(header), 1)).rstrip('1')
+        start_row, end_row = 2, None
+        if range_name:
+            match = A1_ROWS_PATTERN.match(range_name)
+            if not match:
+                raise ValueError(f"Unsupported range: {range_name}")
+            first_col, start, last_col, end = match.groups()
+            start_row = max(int(start or 2), 2)
+            end_row = int(end) if end else None
+            # Column positions are relative to the range's first column
+            offset = gspread.utils.a1_to_rowcol(f"{first_col}1")[1] - 1
+            last = gspread.utils.a1_to_rowcol(f"{last_col}1")[1] - 1
+            outside = [c for c, i in zip(columns, indices) if not offset <= i <= last]
+            if outside:
+                raise ValueError(f"Columns outside range {range_name}: {', '.join(outside)}")
+            indices = [i - offset for i in indices]
+
+        row = start_row
+        while end_row is None or row <= end_row:
+            block_end = row + block_size - 1
+            if end_row is not None:
+                block_end = min(block_end, end_row)
+            values = self._values_get(f"'{title}'!{first_col}{row}:{last_col}{block_end}", value_render)
+            for values_row in values:
+                cells = [values_row[i] if i < len(values_row) else "" for i in indices]
+                yield tuple(convert(cell) if convert else cell for cell, convert in zip(cells, converters))
+            if len(values) < block_end - row + 1:
+                break
+            row = block_end + 1
+
+    def read_frame(self, range_name=None, columns=None, value_render='UNFORMATTED_VALUE', year=None):
+        """Build a DataFrame directly from columnar lists of typed rows."""
+        import pandas as pd
+        if columns is None:
+            columns = self.get_header(year)
+        data = [[] for _ in columns]
+        for values_row in self.iter_rows(range_name, columns=columns, value_render=value_render,
+                                         year=year):
+            for column_values, value in zip(data, values_row):
+                column_values.append(value)
+        return pd.DataFrame(dict(zip(columns, data)))
+
+    def _apply_column_formatting(self, df, worksheet=None):
+        worksheet = worksheet or self.worksheet
         if len(df) == 0:
             return
         
@@ -106,6 +487,6 @@ class SheetsClient:
                 col_letter = gspread.utils.rowcol_to_a1(1, col_index + 1).rstrip('1')
                 cell_range = f"{col_letter}2:{col_letter}"
                 try:
-                    self.worksheet.format(cell_range, format_spec)
+                    worksheet.format(cell_range, format_spec)
                 except Exception as e:
                     print(f"Warning: Could not format column '{col_name}': {e}")
@@ -0,0 +1,54 @@
+"""
+Check that the Worker's copies of shared modules match their originals.
+
+Usage:
+    python -m tools.worker_harness.check_copies
+
+The Worker bundle only ships bot_worker/, so modules used by both the
+fetcher and the bot live in shared/libs/ and are copied into bot_worker/.
+The copies may differ in their module docstring only; anything else is
+printed as a diff and the exit status is non-zero.
+"""
+import ast
+import difflib
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# (original, Worker copy), relative to the repository root
+COPIES = (
+    ("shared/libs/expense_ledger.py", "bot_worker/expense_ledger.py"),
+    ("shared/libs/search_index.py", "bot_worker/search_index.py"),
+)
+
+
+def code_lines(path):
+    """Return the lines of a module after its docstring."""
+    with open(os.path.join(REPO_ROOT, path), encoding="utf-8") as f:
+        source = f.read()
+    lines = source.splitlines(keepends=True)
+    body = ast.parse(source).body
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant) \
+            and isinstance(body[0].value.value, str):
+        return lines[body[0].end_lineno:]
+    return lines
+
+
+def main():
+    mismatched = 0
+    for original, copy in COPIES:
+        diff = list(difflib.unified_diff(code_lines(original), code_lines(copy), original, copy))
+        if diff:
+            mismatched += 1
+            sys.stdout.writelines(diff)
+        else:
+            print(f"ok: {copy}")
+
+    if mismatched:
+        print(f"FAIL: {mismatched} copy(ies) differ from shared/libs beyond the docstring")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Cold-start benchmark for bot_worker under the CPython harness.
+
+Usage:
+    python -m tools.worker_harness.cold_start --command "/report" --runs 10
+
+Each run starts a fresh interpreter, imports worker.py (what a cold isolate
+pays before its first request) and then serves one update for the given
+command. Reports the median import time, first-request time and the
+bot_worker modules loaded at import, so a new command that slows down
+every first request shows up here. With --budget-ms the exit status is
+non-zero when the median import time exceeds the budget.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Runs inside the fresh interpreter and prints one JSON line of timings
+_PROBE = r'''
+import asyncio, json, os, sys, time
+from tools.worker_harness import fake_js
+from tools.worker_harness.fake_services import FakeServices
+from tools.worker_harness.replay import FakeEnv, BOT_WORKER_DIR
+
+services = FakeServices()
+fake_js.install(services)
+worker_dir = os.path.abspath(BOT_WORKER_DIR)
+sys.path.insert(0, worker_dir)
+before = set(sys.modules)
+
+started = time.perf_counter()
+import worker
+import_seconds = time.perf_counter() - started
+
+loaded = sorted(
+    name for name in set(sys.modules) - before
+    if getattr(sys.modules[name], "__file__", None)
+    and os.path.abspath(sys.modules[name].__file__).startswith(worker_dir)
+)
+
+update = {"update_id": 1, "message": {"message_id": 1, "from": {"id": 42},
+          "chat": {"id": 42}, "text": sys.argv[1]}}
+env = FakeEnv(fake_js.FakeKV({"user:42": json.dumps({"is_authorized": True})}))
+started = time.perf_counter()
+asyncio.run(worker.on_fetch(fake_js.FakeRequest(update), env, None))
+first_request_seconds = time.perf_counter() - started
+
+print(json.dumps({"import": import_seconds, "first_request": first_request_seconds, "modules": loaded}))
+'''
+
+
+def run_probe(command):
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, command],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bot_worker cold-start cost.")
+    parser.add_argument("--command", default="/start", help="Message text of the first request")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to start")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if median import time exceeds this")
+    args = parser.parse_args()
+
+    samples = [run_probe(args.command) for _ in range(args.runs)]
+    import_ms = statistics.median(s["import"] for s in samples) * 1000
+    first_ms = statistics.median(s["first_request"] for s in samples) * 1000
+
+    print(f"command:        {args.command}")
+    print(f"runs:           {args.runs}")
+    print(f"import worker:  {import_ms:.2f} ms (median)")
+    print(f"first request:  {first_ms:.2f} ms (median)")
+    print(f"modules at import ({len(samples[0]['modules'])}): {', '.join(samples[0]['modules'])}")
+
+    if args.budget_ms is not None and import_ms > args.budget_ms:
+        print(f"FAIL: import time {import_ms:.2f} ms exceeds budget {args.budget_ms:.2f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
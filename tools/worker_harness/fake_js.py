@@ -0,0 +1,266 @@
+"""
+Fake `js` and `pyodide.ffi` modules so bot_worker can run under plain CPython.
+
+Only the surface bot_worker actually uses is provided: fetch, Response,
+Object.fromEntries/assign/new, AbortSignal.timeout, JSON.parse, Uint8Array,
+crypto.subtle and to_js.
+Outbound fetches are routed to in-process fake services (see fake_services.py)
+and every fetch/KV call is counted against the current request's stats.
+"""
+import asyncio
+import contextvars
+import json
+import sys
+import time
+import types
+from collections import Counter
+from urllib.parse import urlparse
+
+
+# ============================================================================
+# Per-request accounting
+# ============================================================================
+
+class RequestStats:
+    """Outbound fetches, KV operations and CPU time of one webhook request."""
+    def __init__(self):
+        self.fetches = Counter()
+        self.kv_ops = Counter()
+        self.cpu_seconds = 0.0
+        self._resumed_at = None
+
+    def start(self):
+        self._resumed_at = time.process_time()
+
+    def pause(self):
+        if self._resumed_at is not None:
+            self.cpu_seconds += time.process_time() - self._resumed_at
+            self._resumed_at = None
+
+    def resume(self):
+        self._resumed_at = time.process_time()
+
+    @property
+    def fetch_count(self):
+        return sum(self.fetches.values())
+
+    @property
+    def kv_op_count(self):
+        return sum(self.kv_ops.values())
+
+
+current_stats = contextvars.ContextVar("current_stats", default=None)
+
+# Simulated network latency for fetches and KV calls, in seconds
+LATENCY_SECONDS = {"fetch": 0.0, "kv": 0.0}
+
+
+async def _io(kind):
+    """Suspension point: stop CPU accounting while 'waiting on the network'."""
+    stats = current_stats.get()
+    if stats:
+        stats.pause()
+    try:
+        await asyncio.sleep(LATENCY_SECONDS[kind])
+    finally:
+        if stats:
+            stats.resume()
+
+
+# ============================================================================
+# JS value shims
+# ============================================================================
+
+class JsObject(dict):
+    """Plain JS object: a dict that also allows attribute access."""
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def to_py(self):
+        return dict(self)
+
+
+def _object_assign(target, *sources):
+    for source in sources:
+        target.update(source or {})
+    return target
+
+
+class AbortSignal:
+    """AbortSignal.timeout(ms): fetch() fails once the deadline passes."""
+    def __init__(self, timeout_ms):
+        self.timeout_ms = timeout_ms
+
+    @classmethod
+    def timeout(cls, ms):
+        return cls(ms)
+
+
+class AbortError(Exception):
+    """What an aborted fetch() raises (a JsException in Pyodide)."""
+
+
+class JsProxy:
+    """Wrap a Python value the way Pyodide wraps JS values (exposes to_py)."""
+    def __init__(self, value):
+        self._value = value
+
+    def to_py(self):
+        return self._value
+
+
+class FakeResponse:
+    """Both the fetch() result and the js.Response returned by on_fetch."""
+    def __init__(self, body="", status=200):
+        self.body = body
+        self.status = status
+
+    @classmethod
+    def new(cls, body="", options=None):
+        status = (options or {}).get("status", 200)
+        return cls(body, status)
+
+    async def json(self):
+        return JsProxy(json.loads(self.body) if isinstance(self.body, str) else self.body)
+
+    async def text(self):
+        return self.body if isinstance(self.body, str) else json.dumps(self.body)
+
+
+class FakeRequest:
+    """Incoming webhook request passed to on_fetch."""
+    def __init__(self, payload, method="POST"):
+        self.method = method
+        self._payload = payload
+
+    async def json(self):
+        return JsProxy(self._payload)
+
+
+class _Uint8Array:
+    @staticmethod
+    def new(arg):
+        if isinstance(arg, int):
+            return bytearray(arg)
+        return bytearray(arg)
+
+
+class _Subtle:
+    async def importKey(self, fmt, key_data, algo, extractable, usages):
+        await _io("fetch")
+        return {"format": fmt, "algorithm": algo}
+
+    async def sign(self, algo, key, data):
+        await _io("fetch")
+        return b"fake-signature"
+
+
+# ============================================================================
+# Fake KV namespace
+# ============================================================================
+
+class FakeKV:
+    """In-memory Workers KV binding with expirationTtl support."""
+    def __init__(self, initial=None):
+        self._data = {}
+        for key, value in (initial or {}).items():
+            self._data[key] = (value, None)
+
+    def _count(self, op):
+        stats = current_stats.get()
+        if stats:
+            stats.kv_ops[op] += 1
+
+    async def get(self, key):
+        self._count("get")
+        await _io("kv")
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and time.time() >= expires_at:
+            del self._data[key]
+            return None
+        return value
+
+    async def put(self, key, value, options=None):
+        self._count("put")
+        await _io("kv")
+        ttl = (options or {}).get("expirationTtl")
+        self._data[key] = (value, time.time() + ttl if ttl else None)
+
+    async def delete(self, key):
+        self._count("delete")
+        await _io("kv")
+        self._data.pop(key, None)
+
+    async def list(self, options=None):
+        """List keys by prefix in one page (no cursor paging)."""
+        self._count("list")
+        await _io("kv")
+        prefix = (options or {}).get("prefix", "")
+        limit = (options or {}).get("limit", 1000)
+        now = time.time()
+        names = sorted(
+            key for key, (_, expires_at) in self._data.items()
+            if key.startswith(prefix) and (expires_at is None or now < expires_at)
+        )
+        return JsProxy({"keys": [{"name": name} for name in names[:limit]],
+                        "list_complete": len(names) <= limit})
+
+
+# ============================================================================
+# Module installation
+# ============================================================================
+
+def install(services):
+    """
+    Register fake `js`, `pyodide` and `pyodide.ffi` modules.
+
+    Args:
+        services: Object with a `handle(method, url, headers, body)` method
+                  returning (status, payload), e.g. fake_services.FakeServices.
+    """
+    async def fetch(url, options=None):
+        options = options or {}
+        stats = current_stats.get()
+        if stats:
+            stats.fetches[urlparse(url).netloc] += 1
+        signal = options.get("signal")
+        try:
+            await asyncio.wait_for(_io("fetch"), signal.timeout_ms / 1000 if signal else None)
+        except asyncio.TimeoutError:
+            raise AbortError("TimeoutError: The operation was aborted due to timeout")
+        status, payload = services.handle(
+            options.get("method", "GET"), url, options.get("headers", {}), options.get("body")
+        )
+        return FakeResponse(payload, status)
+
+    js = types.ModuleType("js")
+    js.fetch = fetch
+    js.Response = FakeResponse
+    js.Object = types.SimpleNamespace(
+        fromEntries=lambda entries: JsObject(entries),
+        assign=_object_assign,
+        new=JsObject
+    )
+    js.AbortSignal = AbortSignal
+    js.JSON = types.SimpleNamespace(parse=json.loads)
+    js.Uint8Array = _Uint8Array
+    js.crypto = types.SimpleNamespace(subtle=_Subtle())
+
+    ffi = types.ModuleType("pyodide.ffi")
+    ffi.to_js = lambda value, **kwargs: value
+    pyodide = types.ModuleType("pyodide")
+    pyodide.ffi = ffi
+
+    sys.modules["js"] = js
+    sys.modules["pyodide"] = pyodide
+    sys.modules["pyodide.ffi"] = ffi
+    return js
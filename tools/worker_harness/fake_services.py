@@ -0,0 +1,160 @@
+"""
+In-process fake Telegram, Google OAuth and Google Sheets endpoints.
+
+They implement just enough of each API for bot_worker: sendMessage and
+deleteMessage, the JWT bearer token exchange, Sheets values get, batchGet
+and append, and addSheet via batchUpdate against an in-memory spreadsheet.
+"""
+import itertools
+import json
+import random
+import re
+from urllib.parse import urlparse, parse_qs, unquote
+from shared.libs.search_index import SearchIndex
+
+DEFAULT_HEADER = ["date", "category", "description", "amount", "uncleared"]
+PIVOT_SHEET = "(Pivot) Annual Report"
+INDEX_SHEET = "_index"
+SEARCH_SHEET = "_search"
+
+
+def _col_to_index(col):
+    index = 0
+    for ch in col:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index - 1
+
+
+class FakeSpreadsheet:
+    """In-memory spreadsheet; the first sheet holds the expense ledger."""
+    def __init__(self, rows=None, first_sheet="Sheet1"):
+        self.first_sheet = first_sheet
+        self.sheets = {first_sheet: [list(DEFAULT_HEADER)] + [list(r) for r in (rows or [])]}
+        # Published search index, as the fetcher upload would leave it
+        blob = SearchIndex.from_rows(rows or []).to_blob()
+        self.sheets[SEARCH_SHEET] = [["blob", blob]]
+
+    def _split(self, range_name):
+        range_name = unquote(range_name)
+        if "!" in range_name:
+            sheet, cells = range_name.rsplit("!", 1)
+            return sheet.strip("'"), cells
+        return self.first_sheet, range_name
+
+    def get(self, range_name):
+        sheet, cells = self._split(range_name)
+        if sheet == PIVOT_SHEET and sheet not in self.sheets:
+            return self.pivot()
+        values = self.sheets.get(sheet)
+        if values is None:
+            return None
+        match = re.match(r"([A-Z]+)(\d*):([A-Z]+)(\d*)$", cells)
+        if not match:
+            return values
+        c1, r1, c2, r2 = match.groups()
+        start = int(r1) - 1 if r1 else 0
+        end = int(r2) if r2 else len(values)
+        first_col, last_col = _col_to_index(c1), _col_to_index(c2)
+        return [row[first_col:last_col + 1] for row in values[start:end]]
+
+    def add_sheet(self, title):
+        self.sheets.setdefault(title, [])
+
+    def append(self, range_name, rows):
+        sheet, _ = self._split(range_name)
+        # Appending to a missing sheet fails like the real API; the month
+        # index is normally created by the fetcher upload, so emulate that
+        if sheet not in self.sheets and sheet != INDEX_SHEET:
+            return None
+        values = self.sheets.setdefault(sheet, [])
+        first_row = len(values) + 1
+        values.extend(list(r) for r in rows)
+        width = max((len(r) for r in rows), default=1)
+        last_col = chr(ord('A') + width - 1)
+        return f"{sheet}!A{first_row}:{last_col}{len(values)}"
+
+    def pivot(self):
+        """Render a minimal '(Pivot) Annual Report' from the ledger rows."""
+        rows = self.sheets[self.first_sheet][1:]
+        categories = sorted({r[1] for r in rows if r[1] != 'Income'})
+        totals = {}
+        for r in rows:
+            if r[1] == 'Income':
+                continue
+            year, month = str(r[0])[:4], str(r[0])[5:7]
+            totals.setdefault((year, month), {}).setdefault(r[1], 0.0)
+            totals[(year, month)][r[1]] += float(r[3])
+        months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                  "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+        values = [["Annual Report"], ["Year", "Month"] + categories + ["Grand Total"]]
+        last_year = None
+        for (year, month), by_cat in sorted(totals.items()):
+            row = [year if year != last_year else "", months[int(month) - 1]]
+            row += [by_cat.get(c, "") for c in categories]
+            row.append(sum(by_cat.values()))
+            values.append(row)
+            last_year = year
+        return values
+
+
+class FakeServices:
+    """Routes fetch() calls to the fake Telegram, OAuth and Sheets handlers."""
+    def __init__(self, spreadsheet=None, sheets_error_rate=0.0):
+        self.spreadsheet = spreadsheet or FakeSpreadsheet()
+        # Fraction of Sheets calls answered with a 503, to exercise retries
+        self.sheets_error_rate = sheets_error_rate
+        self.sent_messages = []
+        self._message_ids = itertools.count(1)
+
+    def handle(self, method, url, headers, body):
+        parsed = urlparse(url)
+        if parsed.netloc == "api.telegram.org":
+            return self._telegram(parsed.path, json.loads(body or "{}"))
+        if parsed.netloc == "oauth2.googleapis.com":
+            return 200, {"access_token": "fake-access-token", "expires_in": 3600}
+        if parsed.netloc == "sheets.googleapis.com":
+            if random.random() < self.sheets_error_rate:
+                return 503, {"error": {"code": 503, "message": "The service is currently unavailable."}}
+            return self._sheets(method, parsed, json.loads(body) if body else None)
+        return 404, {"error": f"No fake service for {parsed.netloc}"}
+
+    def _telegram(self, path, payload):
+        if path.endswith("/sendMessage"):
+            message_id = next(self._message_ids)
+            self.sent_messages.append(payload)
+            return 200, {"ok": True, "result": {"message_id": message_id}}
+        if path.endswith("/deleteMessage"):
+            return 200, {"ok": True, "result": True}
+        return 404, {"ok": False, "description": "Not Found"}
+
+    def _sheets(self, method, parsed, payload):
+        query = parse_qs(parsed.query)
+        if parsed.path.endswith(":batchUpdate"):
+            for request in payload.get("requests", []):
+                if "addSheet" in request:
+                    title = request["addSheet"]["properties"]["title"]
+                    if title in self.spreadsheet.sheets:
+                        return 400, {"error": {"code": 400, "message": (
+                            f'Invalid requests[0].addSheet: A sheet with the name "{title}" already exists.'
+                        )}}
+                    self.spreadsheet.add_sheet(title)
+            return 200, {"replies": [{} for _ in payload.get("requests", [])]}
+        path = parsed.path.split("/values", 1)[1]
+
+        if path.startswith(":batchGet"):
+            value_ranges = []
+            for range_name in query.get("ranges", []):
+                value_ranges.append({"range": range_name, "values": self.spreadsheet.get(range_name) or []})
+            return 200, {"valueRanges": value_ranges}
+
+        range_name = unquote(path.lstrip("/"))
+        if method == "POST" and range_name.endswith(":append"):
+            updated = self.spreadsheet.append(range_name[:-len(":append")], payload["values"])
+            if updated is None:
+                return 400, {"error": {"code": 400, "message": f"Unable to parse range: {range_name}"}}
+            return 200, {"updates": {"updatedRange": updated, "updatedRows": len(payload["values"])}}
+
+        values = self.spreadsheet.get(range_name)
+        if values is None:
+            return 400, {"error": {"code": 400, "message": f"Unable to parse range: {range_name}"}}
+        return 200, {"range": range_name, "values": values}